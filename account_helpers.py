@@ -0,0 +1,56 @@
+"""
+Helper functions to run the report over multiple accounts of an organization, by assuming a role in each of them
+"""
+
+import threading
+from datetime import datetime, timedelta, timezone
+from client_helpers import get_client, forget_credentials
+from arn_helpers import get_caller_details, build_arn
+
+DEFAULT_MAX_PROCESSES = 4
+SESSION_NAME = 'cost-report'
+RENEW_BEFORE_EXPIRY = timedelta(minutes=10)
+
+# (credentials, expiration) against (account id, role name), of the roles assumed by this process
+assumed_roles = dict()
+assumed_roles_lock = threading.Lock()
+
+
+def assume_role(client, account_id, role_name):
+    """
+    Assumes role_name in the given account using the given STS client,
+    returns the temporary credentials as keyword arguments of boto3.Session
+    """
+    return assume_role_until(client, account_id, role_name)[0]
+
+
+def assume_role_until(client, account_id, role_name):
+    """
+    Same as assume_role, returns (credentials, datetime they expire at)
+    """
+    partition = get_caller_details(client)["partition"]
+    role_arn = build_arn("IAM Role", role_name, "", account_id, partition)
+    credentials = client.assume_role(RoleArn=role_arn, RoleSessionName=SESSION_NAME)['Credentials']
+    return {
+        "aws_access_key_id": credentials['AccessKeyId'],
+        "aws_secret_access_key": credentials['SecretAccessKey'],
+        "aws_session_token": credentials['SessionToken']
+    }, credentials['Expiration']
+
+
+def assume_account_role(account_id, role_name):
+    """
+    Assumes role_name in the given account with the default credentials, for use in worker processes.
+    The credentials are reused until RENEW_BEFORE_EXPIRY before they expire, so that the clients created
+    with them stay warm across the accounts a long running worker collects again and again.
+    """
+    key = (account_id, role_name)
+    with assumed_roles_lock:
+        assumed = assumed_roles.get(key)
+        if assumed is not None and assumed[1] - RENEW_BEFORE_EXPIRY > datetime.now(timezone.utc):
+            return assumed[0]
+        assumed_roles[key] = assume_role_until(get_client("sts"), account_id, role_name)
+    if assumed is not None:
+        # clients of expired credentials would only pile up
+        forget_credentials(assumed[0])
+    return assumed_roles[key][0]
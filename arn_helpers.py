@@ -0,0 +1,33 @@
+"""
+Helper functions to build ARNs of different AWS Resources locally, without describing them
+"""
+
+ARN_FORMATS = {
+    "DynamoDB Table": "arn:{partition}:dynamodb:{region}:{account_id}:table/{name}",
+    "Kinesis Stream": "arn:{partition}:kinesis:{region}:{account_id}:stream/{name}",
+    "Firehose Delivery Stream": "arn:{partition}:firehose:{region}:{account_id}:deliverystream/{name}",
+    "Lambda Function": "arn:{partition}:lambda:{region}:{account_id}:function:{name}",
+    "S3 Bucket": "arn:{partition}:s3:::{name}",
+    "IAM Role": "arn:{partition}:iam::{account_id}:role/{name}",
+}
+
+
+def get_caller_details(client):
+    """
+    Returns account id and partition of the current credentials, using the given STS client
+    """
+    identity = client.get_caller_identity()
+    return {
+        "account_id": identity['Account'],
+        "partition": identity['Arn'].split(":")[1]
+    }
+
+
+def build_arn(resource_type, name, region, account_id, partition="aws"):
+    """
+    Returns ARN for the given resource type and name, None if the ARN format of resource type is unknown
+    """
+    arn_format = ARN_FORMATS.get(resource_type)
+    if arn_format is None:
+        return None
+    return arn_format.format(partition=partition, region=region, account_id=account_id, name=name)
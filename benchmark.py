@@ -0,0 +1,672 @@
+"""
+Benchmarks the report sections and the helper scripts against a synthetic AWS account, offline
+
+Usage
+-------
+python benchmark.py [--scale 0.1] [--sections unattached_volumes,on_demand_ddb] [--output benchmark.json] [--throttle-rate 0.05]
+
+Every AWS call is answered in-process from a generated account, so that the calls can come in any order
+and from any number of threads. Responses are given at before-send, i.e. in place of the HTTP request, as
+the HTTP response of the service's protocol: botocore parses them, the rate limiter paces them and retries
+them like AWS responses, and --throttle-rate of the requests are answered with a throttling error instead.
+The account size is DEFAULT_SCALE times --scale. Each section (along with the sections it depends on)
+and each helper script is run on its own, and its wall time, HTTP requests and peak memory are reported.
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import random
+import runpy
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, date, timedelta
+from xml.etree import ElementTree
+import boto3
+from botocore.awsrequest import AWSResponse
+
+REGION = 'us-east-1'
+ACCOUNT_ID = '123456789012'
+DEFAULT_SCALE = {
+    "lambda_functions": 10000,
+    "dynamodb_tables": 5000,
+    "ec2_instances": 2000,
+    "ebs_volumes": 5000,
+    "ebs_snapshots": 100000,
+    "amis": 2000,
+    "kinesis_streams": 1000,
+    "firehose_delivery_streams": 500,
+    "s3_buckets": 1000,
+    "log_group_metrics": 20000,
+    "rest_apis": 200,
+    "elastic_ips": 200,
+    "cost_resources_per_service": 2000,
+    "tag_resources_rows": 1000,
+}
+COST_SERVICES = ["AWS Lambda", "Amazon DynamoDB", "Amazon Kinesis", "Amazon Elastic Compute Cloud - Compute",
+                 "Amazon Simple Storage Service", "AmazonCloudWatch", "Amazon API Gateway"]
+COST_PAGE_SIZE = 1000  # groups per Cost Explorer page
+# response keys telling there are more pages
+NEXT_PAGE_KEYS = ["NextToken", "NextMarker", "NextPageToken", "PaginationToken", "position", "LastEvaluatedTableName",
+                  "HasMoreStreams", "HasMoreDeliveryStreams"]
+# command lines of the scripts
+# scripts share a directory, in order, so that --apply deletes the snapshots planned by the dry run
+SCRIPTS = [["tag_resources.py"], ["tag_resources.py", "--pipeline"], ["cleanup_snapshots.py"], ["cleanup_snapshots.py", "--apply", "--workers", "16", "--rate", "50"]]
+STARTUP_ATTEMPTS = 3  # fastest of the attempts is reported
+CREATED = datetime(2020, 1, 1)
+REQUEST_ID = '00000000-0000-0000-0000-000000000000'
+# (HTTP status, error code) AWS throttles the requests of every protocol with
+THROTTLING_ERRORS = {
+    "json": (400, "ThrottlingException"),
+    "rest-json": (429, "TooManyRequestsException"),
+    "query": (400, "Throttling"),
+    "ec2": (503, "RequestLimitExceeded"),
+    "rest-xml": (503, "SlowDown"),
+}
+
+
+def get_page(items, params, token_param, size):
+    """
+    Returns (page of items, next token or None) for a token holding the offset of the page
+    """
+    start = int(params.get(token_param) or 0)
+    end = start + size
+    return items[start:end], (str(end) if end < len(items) else None)
+
+
+def get_tags(index):
+    """
+    Tags of the index-th resource, a third of the resources miss some of them
+    """
+    tags = [{"Key": "Name", "Value": "resource-{}".format(index)}]
+    if index % 3:
+        tags.append({"Key": "STAGE", "Value": "prod"})
+        tags.append({"Key": "Pipeline", "Value": "pipeline-{}".format(index % 7)})
+    return tags
+
+
+def format_timestamp(value):
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def get_json_value(shape, value):
+    """
+    Returns the value of the given shape as it is in a JSON body, with the members named as botocore's parsers expect
+    """
+    if shape.type_name == "structure":
+        return {member.serialization.get("name", name): get_json_value(member, value[name])
+                for name, member in shape.members.items() if value.get(name) is not None}
+    if shape.type_name == "list":
+        return [get_json_value(shape.member, item) for item in value]
+    if shape.type_name == "map":
+        return {key: get_json_value(shape.value, item) for key, item in value.items()}
+    if shape.type_name == "timestamp":
+        return format_timestamp(value)
+    return value
+
+
+def add_xml_members(element, shape, value):
+    """
+    Appends the members of the value of a structure shape to the XML element, named as botocore's parsers expect
+    """
+    for name, member in shape.members.items():
+        if value.get(name) is None:
+            continue
+        if member.type_name == "list" and member.serialization.get("flattened"):
+            for item in value[name]:
+                add_xml_value(element, member.member, member.member.serialization.get("name", name), item)
+        else:
+            add_xml_value(element, member, member.serialization.get("name", name), value[name])
+
+
+def add_xml_value(parent, shape, name, value):
+    element = ElementTree.SubElement(parent, name)
+    if shape.type_name == "structure":
+        add_xml_members(element, shape, value)
+    elif shape.type_name == "list":
+        for item in value:
+            add_xml_value(element, shape.member, shape.member.serialization.get("name", "member"), item)
+    elif shape.type_name == "map":
+        for key, item in value.items():
+            entry = ElementTree.SubElement(element, "entry")
+            add_xml_value(entry, shape.key, shape.key.serialization.get("name", "key"), key)
+            add_xml_value(entry, shape.value, shape.value.serialization.get("name", "value"), item)
+    elif shape.type_name == "boolean":
+        element.text = "true" if value else "false"
+    elif shape.type_name == "timestamp":
+        element.text = format_timestamp(value)
+    else:
+        element.text = str(value)
+
+
+def serialize_response(operation_model, response):
+    """
+    Returns the HTTP body AWS answers the operation with, for the response dict of the synthetic account
+    """
+    protocol = operation_model.metadata["protocol"]
+    shape = operation_model.output_shape
+    if protocol in ("json", "rest-json"):
+        return json.dumps(get_json_value(shape, response) if shape is not None else dict()).encode("utf-8")
+    root = ElementTree.Element(operation_model.name + "Response")
+    if shape is not None:
+        if protocol == "query":
+            add_xml_members(ElementTree.SubElement(root, shape.serialization["resultWrapper"]), shape, response)
+        else:
+            add_xml_members(root, shape, response)
+    if protocol == "query":
+        ElementTree.SubElement(ElementTree.SubElement(root, "ResponseMetadata"), "RequestId").text = REQUEST_ID
+    return ElementTree.tostring(root)
+
+
+def serialize_throttling_error(protocol):
+    """
+    Returns (HTTP status, headers, body) of a throttling error of the given protocol
+    """
+    status, code = THROTTLING_ERRORS[protocol]
+    message = "Rate exceeded"
+    if protocol == "json":
+        return status, dict(), json.dumps({"__type": code, "message": message}).encode("utf-8")
+    if protocol == "rest-json":
+        return status, {"x-amzn-errortype": code}, json.dumps({"message": message}).encode("utf-8")
+    if protocol == "ec2":
+        root = ElementTree.Element("Response")
+        error = ElementTree.SubElement(ElementTree.SubElement(root, "Errors"), "Error")
+        ElementTree.SubElement(root, "RequestID").text = REQUEST_ID
+    elif protocol == "query":
+        root = ElementTree.Element("ErrorResponse")
+        error = ElementTree.SubElement(root, "Error")
+        ElementTree.SubElement(root, "RequestId").text = REQUEST_ID
+    else:
+        root = error = ElementTree.Element("Error")
+    ElementTree.SubElement(error, "Code").text = code
+    ElementTree.SubElement(error, "Message").text = message
+    return status, dict(), ElementTree.tostring(root)
+
+
+class SyntheticBody:
+    """
+    Raw HTTP body of a synthetic response, read by botocore in the same way as urllib3's
+    """
+
+    def __init__(self, content):
+        self.content = content
+
+    def stream(self, **kwargs):
+        yield self.content
+
+
+class SyntheticAccount:
+    """
+    Resources of a generated account and the responses to the calls the report makes on them
+    """
+
+    def __init__(self, scale, throttle_rate=0.0):
+        self.scale = scale
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(0)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.calls = 0
+        self.throttled = 0
+        self.functions = ["function-{:06d}".format(i) for i in range(scale["lambda_functions"])]
+        self.tables = ["table-{:06d}".format(i) for i in range(scale["dynamodb_tables"])]
+        self.instances = ["i-{:017x}".format(i) for i in range(scale["ec2_instances"])]
+        self.volumes = ["vol-{:017x}".format(i) for i in range(scale["ebs_volumes"])]
+        self.snapshots = ["snap-{:017x}".format(i) for i in range(scale["ebs_snapshots"])]
+        self.streams = ["stream-{:06d}".format(i) for i in range(scale["kinesis_streams"])]
+        self.delivery_streams = ["delivery-{:06d}".format(i) for i in range(scale["firehose_delivery_streams"])]
+        self.buckets = ["bucket-{:06d}".format(i) for i in range(scale["s3_buckets"])]
+        self.log_groups = ["/aws/lambda/function-{:06d}".format(i) for i in range(scale["log_group_metrics"])]
+        self.table_indexes = {table: index for index, table in enumerate(self.tables)}
+        self.instance_indexes = {instance: index for index, instance in enumerate(self.instances)}
+        self.volume_indexes = {volume: index for index, volume in enumerate(self.volumes)}
+        self.handlers = {
+            "ListFunctions": self.list_functions,
+            "ListTags": lambda params: {"Tags": self.get_tags_dict(params["Resource"])},
+            "GetFunction": lambda params: {"Configuration": self.get_function(params["FunctionName"])},
+            "ListTables": self.list_tables,
+            "DescribeTable": self.describe_table,
+            "ListTagsOfResource": lambda params: {"Tags": get_tags(len(params["ResourceArn"]))},
+            "DescribeInstances": self.describe_instances,
+            "DescribeVolumes": self.describe_volumes,
+            "DescribeSnapshots": self.describe_snapshots,
+            "DescribeImages": self.describe_images,
+            "DeleteSnapshot": lambda params: {},
+            "DescribeAddresses": self.describe_addresses,
+            "DescribeRegions": lambda params: {"Regions": [{"RegionName": REGION}]},
+            "ListStreams": self.list_streams,
+            "DescribeStream": self.describe_stream,
+            "ListTagsForStream": lambda params: {"Tags": get_tags(len(params["StreamName"])), "HasMoreTags": False},
+            "ListDeliveryStreams": self.list_delivery_streams,
+            "DescribeDeliveryStream": self.describe_delivery_stream,
+            "ListTagsForDeliveryStream": lambda params: {"Tags": get_tags(len(params["DeliveryStreamName"])), "HasMoreTags": False},
+            "ListBuckets": lambda params: {"Buckets": [{"Name": bucket, "CreationDate": CREATED} for bucket in self.buckets]},
+            "GetBucketTagging": lambda params: {"TagSet": get_tags(int(params["Bucket"].split("-")[-1]))},
+            "GetResources": self.get_resources,
+            "TagResources": lambda params: {"FailedResourcesMap": {}},
+            "GetCallerIdentity": lambda params: {"Account": ACCOUNT_ID, "Arn": "arn:aws:iam::{}:user/benchmark".format(ACCOUNT_ID), "UserId": "benchmark"},
+            "GetCostAndUsage": self.get_cost_and_usage,
+            "ListMetrics": self.list_metrics,
+            "GetMetricData": self.get_metric_data,
+            "GetRestApis": self.get_rest_apis,
+            "GetStages": self.get_stages,
+        }
+
+    def install(self, session):
+        """
+        Answers all the requests of the clients created from now on by the given boto3 session
+        """
+        session.events.register("before-parameter-build.*.*", self.keep_params)
+        # last, so that the handlers of the clients (e.g. the rate limiter) see every request first
+        session.events.register_last("before-send.*.*", self.respond)
+
+    def keep_params(self, params, model, **kwargs):
+        # before-send only gets the serialized request, keep the call for it (and for its retries) in its thread
+        self.local.call = (model, dict(params))
+
+    def respond(self, request, **kwargs):
+        model, params = self.local.call
+        protocol = model.metadata["protocol"]
+        with self.lock:
+            self.calls += 1
+            throttled = self.random.random() < self.throttle_rate
+            if throttled:
+                self.throttled += 1
+        if throttled:
+            status, headers, body = serialize_throttling_error(protocol)
+            return AWSResponse(request.url, status, headers, SyntheticBody(body))
+        handler = self.handlers.get(model.name)
+        if handler is None:
+            raise Exception("ERROR: {} is not supported by the synthetic account :(".format(model.name))
+        # a loop asking again for the page it was just given would never end
+        paged_request = (model.name, repr(sorted(params.items())))
+        if getattr(self.local, "paged_request", None) == paged_request:
+            raise Exception("ERROR: {} asked twice for the same page, its pagination token is not passed on :(".format(model.name))
+        response = handler(params)
+        self.local.paged_request = paged_request if any(response.get(key) for key in NEXT_PAGE_KEYS) else None
+        return AWSResponse(request.url, 200, {"x-amzn-requestid": REQUEST_ID}, SyntheticBody(serialize_response(model, response)))
+
+    def get_arn(self, service, resource):
+        return "arn:aws:{}:{}:{}:{}".format(service, REGION, ACCOUNT_ID, resource)
+
+    def get_tags_dict(self, arn):
+        return {tag["Key"]: tag["Value"] for tag in get_tags(len(arn))}
+
+    def get_function(self, name):
+        return {"FunctionName": name, "FunctionArn": self.get_arn("lambda", "function:" + name), "Runtime": "python3.9",
+                "MemorySize": 128, "LastModified": "2020-01-01T00:00:00.000+0000"}
+
+    def list_functions(self, params):
+        names, next_marker = get_page(self.functions, params, "Marker", params.get("MaxItems", 50))
+        response = {"Functions": [self.get_function(name) for name in names]}
+        if next_marker:
+            response["NextMarker"] = next_marker
+        return response
+
+    def list_tables(self, params):
+        start = self.table_indexes[params["ExclusiveStartTableName"]] + 1 if params.get("ExclusiveStartTableName") else 0
+        names = self.tables[start:start + params.get("Limit", 100)]
+        response = {"TableNames": names}
+        if names and start + len(names) < len(self.tables):
+            response["LastEvaluatedTableName"] = names[-1]
+        return response
+
+    def describe_table(self, params):
+        name = params["TableName"]
+        index = self.table_indexes.get(name, len(name))
+        return {"Table": {
+            "TableName": name, "TableArn": self.get_arn("dynamodb", "table/" + name), "TableStatus": "ACTIVE",
+            "ItemCount": index * 1000, "TableSizeBytes": index * 1024 * 1024, "CreationDateTime": CREATED,
+            "BillingModeSummary": {"BillingMode": "PAY_PER_REQUEST" if index % 4 == 0 else "PROVISIONED"}
+        }}
+
+    def get_instance(self, instance_id):
+        index = self.instance_indexes[instance_id]
+        return {"InstanceId": instance_id, "Tags": get_tags(index), "LaunchTime": CREATED,
+                "State": {"Name": "running" if index % 5 else "stopped"}}
+
+    def describe_instances(self, params):
+        if params.get("InstanceIds"):
+            instances = [instance for instance in params["InstanceIds"] if instance in self.instance_indexes]
+            next_token = None
+        else:
+            instances, next_token = get_page(self.instances, params, "NextToken", params.get("MaxResults", 1000))
+        response = {"Reservations": [{"ReservationId": "r-" + instance[2:], "Instances": [self.get_instance(instance)]}
+                                     for instance in instances]}
+        if next_token:
+            response["NextToken"] = next_token
+        return response
+
+    def get_volume(self, volume_id):
+        index = self.volume_indexes[volume_id]
+        # every other volume is attached, to an instance which may not exist anymore
+        attachments = [{"InstanceId": "i-{:017x}".format(index * 2 // 3)}] if index % 2 else []
+        return {"VolumeId": volume_id, "Size": 8 + index % 100, "SnapshotId": "", "CreateTime": CREATED, "Tags": get_tags(index),
+                "State": "in-use" if attachments else "available", "Attachments": attachments}
+
+    def describe_volumes(self, params):
+        if params.get("VolumeIds"):
+            volumes = [volume for volume in params["VolumeIds"] if volume in self.volume_indexes]
+            return {"Volumes": [self.get_volume(volume) for volume in volumes]}
+        volumes = self.volumes
+        for volume_filter in params.get("Filters", []):
+            if volume_filter["Name"] == "status":
+                volumes = [volume for volume in volumes if self.get_volume(volume)["State"] in volume_filter["Values"]]
+        volumes, next_token = get_page(volumes, params, "NextToken", params.get("MaxResults", 500))
+        response = {"Volumes": [self.get_volume(volume) for volume in volumes]}
+        if next_token:
+            response["NextToken"] = next_token
+        return response
+
+    def describe_snapshots(self, params):
+        snapshots, next_token = get_page(self.snapshots, params, "NextToken", params.get("MaxResults", 1000))
+        response = {"Snapshots": [{
+            "SnapshotId": snapshot, "Description": "", "StartTime": CREATED, "VolumeSize": 8, "State": "completed",
+            # snapshots outlive their volumes, a third of them point to deleted ones
+            "VolumeId": "vol-{:017x}".format(index % (len(self.volumes) * 3 // 2 or 1))
+        } for index, snapshot in enumerate(snapshots, int(params.get("NextToken") or 0))]}
+        if next_token:
+            response["NextToken"] = next_token
+        return response
+
+    def describe_images(self, params):
+        step = max(1, len(self.snapshots) // max(1, self.scale["amis"]))
+        return {"Images": [{
+            "ImageId": "ami-{:017x}".format(index), "Name": "image-{}".format(index),
+            "BlockDeviceMappings": [{"Ebs": {"SnapshotId": self.snapshots[index * step]}}]
+        } for index in range(min(self.scale["amis"], len(self.snapshots)))]}
+
+    def describe_addresses(self, params):
+        addresses = []
+        for index in range(self.scale["elastic_ips"]):
+            address = {"PublicIp": "10.0.{}.{}".format(index // 256, index % 256), "AllocationId": "eipalloc-{}".format(index)}
+            if index % 2 and self.instances:
+                address["InstanceId"] = self.instances[index % len(self.instances)]
+            addresses.append(address)
+        return {"Addresses": addresses}
+
+    def list_streams(self, params):
+        start = self.streams.index(params["ExclusiveStartStreamName"]) + 1 if params.get("ExclusiveStartStreamName") else 0
+        names = self.streams[start:start + params.get("Limit", 100)]
+        return {"StreamNames": names, "HasMoreStreams": start + len(names) < len(self.streams)}
+
+    def describe_stream(self, params):
+        name = params["StreamName"]
+        shards = [{"ShardId": "shardId-{:012d}".format(index)} for index in range(min(len(name), params.get("Limit", 100)))]
+        return {"StreamDescription": {"StreamName": name, "StreamARN": self.get_arn("kinesis", "stream/" + name),
+                                      "StreamStatus": "ACTIVE", "Shards": shards, "HasMoreShards": False}}
+
+    def list_delivery_streams(self, params):
+        names = self.delivery_streams
+        if params.get("ExclusiveStartDeliveryStreamName"):
+            names = names[names.index(params["ExclusiveStartDeliveryStreamName"]) + 1:]
+        limit = params.get("Limit", 10)
+        return {"DeliveryStreamNames": names[:limit], "HasMoreDeliveryStreams": len(names) > limit}
+
+    def describe_delivery_stream(self, params):
+        name = params["DeliveryStreamName"]
+        return {"DeliveryStreamDescription": {"DeliveryStreamName": name, "DeliveryStreamARN": self.get_arn("firehose", "deliverystream/" + name)}}
+
+    def get_resources(self, params):
+        resources = []
+        for resource_type in params.get("ResourceTypeFilters", []):
+            if resource_type == "lambda:function":
+                resources.extend(self.get_arn("lambda", "function:" + name) for name in self.functions)
+            elif resource_type == "dynamodb:table":
+                resources.extend(self.get_arn("dynamodb", "table/" + name) for name in self.tables)
+            elif resource_type == "kinesis:stream":
+                resources.extend(self.get_arn("kinesis", "stream/" + name) for name in self.streams)
+            elif resource_type == "firehose:deliverystream":
+                resources.extend(self.get_arn("firehose", "deliverystream/" + name) for name in self.delivery_streams)
+            elif resource_type == "s3":
+                resources.extend("arn:aws:s3:::" + name for name in self.buckets)
+        arns, next_token = get_page(resources, params, "PaginationToken", params.get("ResourcesPerPage", 100))
+        return {"ResourceTagMappingList": [{"ResourceARN": arn, "Tags": get_tags(len(arn))} for arn in arns],
+                "PaginationToken": next_token or ""}
+
+    def get_cost_groups(self, params):
+        """
+        Returns list of (time period, group) of the query, every named resource of the three
+        services reported by name costs a little every day
+        """
+        start = date.fromisoformat(params["TimePeriod"]["Start"])
+        end = date.fromisoformat(params["TimePeriod"]["End"])
+        services = COST_SERVICES
+        if params.get("Filter"):
+            services = [service for service in services if service in params["Filter"]["Dimensions"]["Values"]]
+        tag_keys = [group["Key"] for group in params["GroupBy"] if group["Type"] == "TAG"]
+        periods = []
+        day = start
+        while day < end:
+            if params["Granularity"] == "DAILY":
+                next_day = day + timedelta(days=1)
+            else:
+                next_day = min(end, (day.replace(day=1) + timedelta(days=32)).replace(day=1))
+            periods.append((day, next_day))
+            day = next_day
+        groups = []
+        for period_start, period_end in periods:
+            days = (period_end - period_start).days
+            time_period = {"Start": period_start.isoformat(), "End": period_end.isoformat()}
+            for service_index, service in enumerate(services):
+                names = [""]
+                if tag_keys and service in COST_SERVICES[:3]:
+                    names += ["{}-{:06d}".format(service.split()[-1].lower(), index)
+                              for index in range(self.scale["cost_resources_per_service"])]
+                for index, name in enumerate(names):
+                    keys = [service] + ["{}${}".format(tag_key, name) for tag_key in tag_keys]
+                    amount = days * (service_index + 1) * (1.0 + index % 97) / 10.0
+                    groups.append((time_period, {"Keys": keys, "Metrics": {"UnblendedCost": {"Amount": str(amount), "Unit": "USD"}}}))
+        return groups
+
+    def get_cost_and_usage(self, params):
+        groups, next_token = get_page(self.get_cost_groups(params), params, "NextPageToken", COST_PAGE_SIZE)
+        results = []
+        for time_period, group in groups:
+            if not results or results[-1]["TimePeriod"] != time_period:
+                results.append({"TimePeriod": time_period, "Groups": [], "Total": {}, "Estimated": False})
+            results[-1]["Groups"].append(group)
+        response = {"ResultsByTime": results, "GroupDefinitions": params["GroupBy"]}
+        if next_token:
+            response["NextPageToken"] = next_token
+        return response
+
+    def list_metrics(self, params):
+        metrics = [{"Namespace": "AWS/Logs", "MetricName": "IncomingBytes", "Dimensions": [{"Name": "LogGroupName", "Value": log_group}]}
+                   for log_group in self.log_groups]
+        metrics.append({"Namespace": "AWS/Logs", "MetricName": "IncomingBytes", "Dimensions": []})
+        metrics, next_token = get_page(metrics, params, "NextToken", 500)
+        response = {"Metrics": metrics}
+        if next_token:
+            response["NextToken"] = next_token
+        return response
+
+    def get_metric_data(self, params):
+        results = []
+        for query in params["MetricDataQueries"]:
+            if "Expression" in query:
+                # top N of a Metrics Insights query, the longer the name the more bytes (as for MetricStat queries)
+                limit = int(query["Expression"].split("LIMIT")[-1])
+                top = sorted(self.log_groups, key=len, reverse=True)[:limit]
+                results.extend({"Id": query["Id"], "Label": log_group, "StatusCode": "Complete",
+                                "Values": [float(len(log_group) * 1024 ** 3)], "Timestamps": [CREATED]} for log_group in top)
+                continue
+            dimensions = query["MetricStat"]["Metric"].get("Dimensions") or [{"Value": "IncomingBytes"}]
+            label = dimensions[0]["Value"]
+            results.append({"Id": query["Id"], "Label": label, "StatusCode": "Complete",
+                            "Values": [float(len(label) * 1024 ** 3)], "Timestamps": [CREATED]})
+        return {"MetricDataResults": results}
+
+    def get_rest_apis(self, params):
+        apis = [{"id": "api{:06d}".format(index), "name": "rest-api-{}".format(index)} for index in range(self.scale["rest_apis"])]
+        apis, position = get_page(apis, params, "position", params.get("limit", 25))
+        response = {"items": apis}
+        if position:
+            response["position"] = position
+        return response
+
+    def get_stages(self, params):
+        log_group = self.log_groups[len(params["restApiId"]) % len(self.log_groups)] if self.log_groups else "none"
+        return {"item": [{"stageName": stage, "accessLogSettings": {"destinationArn": self.get_arn("logs", "log-group:" + log_group)}}
+                         for stage in ["dev", "prod"]]}
+
+
+def get_benchmark_config():
+    """
+    Returns config.json with all the sections enabled, in the default region, and no cache
+    """
+    with open("config.json") as json_file:
+        config = json.load(json_file)
+    for name, section_config in config.items():
+        if name != "settings":
+            section_config["enabled"] = True
+    settings = config.setdefault("settings", dict())
+    settings["regions"] = []
+    settings.setdefault("cost_explorer_cache", dict())["enabled"] = False
+    return config
+
+
+@contextlib.contextmanager
+def measure(name, account, results, verbose):
+    """
+    Records wall time, HTTP requests (retries included), throttled requests and peak memory
+    (above what was allocated before) of the block
+    """
+    calls = account.calls
+    throttled = account.throttled
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.monotonic()
+    error = None
+    with open(os.devnull, "w") as devnull:
+        try:
+            with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(devnull):
+                yield
+        except Exception as e:
+            error = str(e)
+    results.append({
+        "name": name,
+        "wall_time_seconds": time.monotonic() - started,
+        "api_calls": account.calls - calls,
+        "throttled_calls": account.throttled - throttled,
+        "peak_memory_mb": (tracemalloc.get_traced_memory()[1] - baseline) / 1024.0 / 1024.0,
+        "error": error,
+    })
+    print("{:<40} {:>10.2f}s {:>10} calls {:>8} throttled {:>10.1f} MB  {}".format(
+        name, results[-1]["wall_time_seconds"], results[-1]["api_calls"], results[-1]["throttled_calls"],
+        results[-1]["peak_memory_mb"], error or ""))
+
+
+def measure_startup(results):
+    """
+    Records the time a new process takes to import the report, above the time it takes to start Python
+    """
+    def run(code):
+        started = time.monotonic()
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return time.monotonic() - started
+    python_seconds = min(run("pass") for attempt in range(STARTUP_ATTEMPTS))
+    import_seconds = min(run("import cost_report") for attempt in range(STARTUP_ATTEMPTS))
+    results.append({
+        "name": "startup (import cost_report)",
+        "wall_time_seconds": import_seconds - python_seconds,
+        "api_calls": 0,
+        "throttled_calls": 0,
+        "peak_memory_mb": None,
+        "error": None,
+    })
+    print("{:<40} {:>10.2f}s".format(results[-1]["name"], results[-1]["wall_time_seconds"]))
+
+
+def write_to_tag_csv(account, directory):
+    """
+    Writes to_tag.csv of tag_resources.py in directory, naming resources of the synthetic account
+    """
+    with open(os.path.join(directory, "to_tag.csv"), "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["Resource", "Name", "Tag:Name", "Tag:STAGE"])
+        resources = [("Lambda Function", account.functions), ("DynamoDB Table", account.tables), ("S3 Bucket", account.buckets),
+                     ("Kinesis Stream", account.streams), ("Firehose Delivery Stream", account.delivery_streams)]
+        for index in range(account.scale["tag_resources_rows"]):
+            resource_type, names = resources[index % len(resources)]
+            if names:
+                writer.writerow([resource_type, names[index // len(resources) % len(names)], "name-{}".format(index % 10), "prod"])
+
+
+def run_script(command, directory, account, results, verbose):
+    """
+    Runs a helper script (command line of SCRIPTS) in directory
+    """
+    path = os.path.abspath(command[0])
+    cwd = os.getcwd()
+    argv = sys.argv
+    os.chdir(directory)
+    sys.argv = [path] + command[1:]
+    try:
+        with measure(" ".join(command), account, results, verbose):
+            runpy.run_path(path, run_name="__main__")
+    finally:
+        os.chdir(cwd)
+        sys.argv = argv
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the report against a synthetic account")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier of the default account size")
+    parser.add_argument("--sections", default="", help="comma separated config.json keys (and script names) to run, all by default")
+    parser.add_argument("--output", default="", help="JSON file to write the results to")
+    parser.add_argument("--verbose", action="store_true", help="keep the output of the sections")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of the requests answered with a throttling error")
+    args = parser.parse_args()
+
+    scale = {key: int(value * args.scale) for key, value in DEFAULT_SCALE.items()}
+    account = SyntheticAccount(scale, args.throttle_rate)
+    # the synthetic account has to be installed before any client is created, i.e. before importing the report
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    boto3.setup_default_session(region_name=REGION)
+    account.install(boto3.DEFAULT_SESSION)
+    import ebs_helpers
+    from cost_report import collect_sheets, SECTION_COLLECTORS, SECTION_DEPENDENCIES
+    from output_helpers import XlsxSink, write_sheets
+
+    config = get_benchmark_config()
+    selected = [name for name in args.sections.split(",") if name]
+    sections = [name for name in config if name in SECTION_COLLECTORS and (not selected or name in selected)]
+    scripts = [command for command in SCRIPTS if not selected or command[0] in selected]
+    print("Benchmarking", ", ".join(sections + [" ".join(command) for command in scripts]), "with", json.dumps(scale))
+
+    results = []
+    measure_startup(results)
+    tracemalloc.start()
+    output_directory = tempfile.mkdtemp()
+    for name in sections:
+        # sections run along with the sections they depend on
+        needed = [dependency for dependency in SECTION_DEPENDENCIES.get(name, []) if dependency in SECTION_COLLECTORS] + [name]
+        sheets = dict()
+        with measure(name, account, results, args.verbose):
+            sheets = collect_sheets(config, needed)
+        if name in sheets:
+            with measure(name + " (xlsx)", account, results, args.verbose):
+                write_sheets([XlsxSink(os.path.join(output_directory, name + ".xlsx"))], [(name, sheets[name])])
+        del sheets
+        ebs_helpers.clear_cache()
+    script_directory = tempfile.mkdtemp()
+    write_to_tag_csv(account, script_directory)
+    for command in scripts:
+        run_script(command, script_directory, account, results, args.verbose)
+    tracemalloc.stop()
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"scale": scale, "throttle_rate": args.throttle_rate, "results": results}, output_file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
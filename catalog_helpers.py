@@ -0,0 +1,90 @@
+"""
+Helper functions to fetch the resources of a region at most once per run, shared by all the sections
+
+Listings and descriptions are fetched lazily by the first section asking for them, and every other
+section (running concurrently or later) reads the same copy.
+"""
+
+import threading
+from fetch_helpers import get_lambda_functions, get_dynamodb_tables, get_ec2_reservations
+from fetch_helpers import get_kinesis_streams, get_firehose_delivery_streams
+
+KINESIS_SHARDS_LIMIT = 100
+
+
+class ResourceCatalog:
+    """
+    Memoized resources of a single region (and account), fetched with the clients of the given ClientPool.
+    Safe to read from concurrent sections, every resource is fetched by a single one of them
+    while the others wait for it. Failed fetches are not memoized.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.entries = dict()
+        self.lock = threading.Lock()
+
+    def get(self, key, fetch):
+        """
+        Returns the memoized value of key, calling fetch() to get it the first time
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = {"lock": threading.Lock()}
+        with entry["lock"]:
+            if "value" not in entry:
+                entry["value"] = fetch()
+            return entry["value"]
+
+    def functions(self):
+        return self.get("functions", lambda: list(get_lambda_functions(self.pool.client("lambda"))))
+
+    def tables(self):
+        return self.get("tables", lambda: list(get_dynamodb_tables(self.pool.client("dynamodb"))))
+
+    def table(self, name):
+        """
+        Returns the describe_table details of the given table
+        """
+        return self.get(("table", name), lambda: self.pool.client("dynamodb").describe_table(TableName=name)['Table'])
+
+    def reservations(self):
+        return self.get("reservations", lambda: list(get_ec2_reservations(self.pool.client("ec2"))))
+
+    def instance(self, instance_id):
+        """
+        Returns details of the given instance, None if it doesn't exist
+        """
+        instances = self.get("instances", lambda: {
+            instance['InstanceId']: instance for reservation in self.reservations() for instance in reservation['Instances']
+        })
+        return instances.get(instance_id)
+
+    def streams(self):
+        return self.get("streams", lambda: list(get_kinesis_streams(self.pool.client("kinesis"))))
+
+    def stream(self, name):
+        """
+        Returns the describe_stream details of the given stream, with the first KINESIS_SHARDS_LIMIT shards
+        """
+        return self.get(("stream", name), lambda: self.pool.client("kinesis").describe_stream(
+            StreamName=name, Limit=KINESIS_SHARDS_LIMIT)['StreamDescription'])
+
+    def delivery_streams(self):
+        return self.get("delivery_streams", lambda: list(get_firehose_delivery_streams(self.pool.client("firehose"))))
+
+    def buckets(self):
+        """
+        Returns names of all the buckets of the account, buckets are global so ask a single region's catalog
+        """
+        return self.get("buckets", lambda: [bucket['Name'] for bucket in self.bucket_list()])
+
+    def bucket_list(self):
+        return self.get("bucket_list", lambda: self.pool.client("s3").list_buckets()['Buckets'])
+
+    def bucket_creation_date(self, name):
+        creation_dates = self.get("bucket_creation_dates", lambda: {
+            bucket['Name']: bucket.get('CreationDate') for bucket in self.bucket_list()
+        })
+        return creation_dates.get(name)
@@ -1,11 +1,152 @@
 """
 Deletes all unreferenced Snapshots
+
+Usage
+-------
+python cleanup_snapshots.py [--plan cleanup_plan.csv]
+    Dry run, writes the snapshots which have none of the volume, instance or the AMI to the plan file
+python cleanup_snapshots.py --apply [--plan cleanup_plan.csv] [--workers 4] [--rate 5]
+    Deletes the snapshots of the plan file, concurrently and at most rate per second. Every deletion is
+    checkpointed next to the plan, so running it again after an interruption resumes where it stopped.
 """
 
-from ebs_helpers import get_snapshots, ec2
-print("Fetching snapshots...")
-for snapshot in get_snapshots():
-    print("Checking", snapshot['id'])
-    if not snapshot['volume_exists'] and not snapshot['ami_exists'] and not snapshot['instance_exists']:
-        print("Deleting ", snapshot['id'])
-        ec2.delete_snapshot(SnapshotId=snapshot['id'])
\ No newline at end of file
+import argparse
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.exceptions import ClientError
+from client_helpers import get_client, configure_pool_connections
+from ebs_helpers import get_snapshots
+from throttle_helpers import TokenBucket, is_throttling_error
+
+DEFAULT_PLAN_PATH = 'cleanup_plan.csv'
+DEFAULT_WORKERS = 4
+DEFAULT_RATE = 5.0  # deletions per second
+PLAN_HEADINGS = ["Snapshot ID", "Size (GB)", "Start Time", "Volume ID", "Description"]
+DELETED = 'deleted'
+# snapshots deleted meanwhile (e.g. by an interrupted run, before its checkpoint) count as deleted
+ALREADY_DELETED_ERROR_CODES = {'InvalidSnapshot.NotFound'}
+
+
+def get_checkpoint_path(plan_path):
+    return plan_path + ".done"
+
+
+def write_plan(plan_path):
+    """
+    Writes the unreferenced snapshots to the plan file, returns (number of snapshots, GB)
+    """
+    count = 0
+    size = 0
+    with open(plan_path, "w", newline="") as plan_file:
+        writer = csv.writer(plan_file)
+        writer.writerow(PLAN_HEADINGS)
+        for snapshot in get_snapshots():
+            if not snapshot['volume_exists'] and not snapshot['ami_exists'] and not snapshot['instance_exists']:
+                writer.writerow([snapshot['id'], snapshot['size'], snapshot['start_time'], snapshot['volume_id'], snapshot['description']])
+                count += 1
+                size += snapshot['size']
+    # a new plan starts over
+    if os.path.exists(get_checkpoint_path(plan_path)):
+        os.remove(get_checkpoint_path(plan_path))
+    return count, size
+
+
+def read_plan(plan_path):
+    """
+    Returns list of (snapshot id, size in GB) of the plan file
+    """
+    if not os.path.exists(plan_path):
+        raise Exception("ERROR: {} not found, run without --apply first to write it :(".format(plan_path))
+    with open(plan_path, newline="") as plan_file:
+        reader = csv.reader(plan_file)
+        next(reader)
+        return [(row[0], int(row[1])) for row in reader]
+
+
+def read_checkpoint(checkpoint_path):
+    """
+    Returns set of the snapshot ids deleted by earlier runs
+    """
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path) as checkpoint_file:
+        return set(line.split("\t")[0] for line in checkpoint_file if line.endswith("\t" + DELETED + "\n"))
+
+
+def delete_snapshot(snapshot_id, bucket):
+    """
+    Deletes the snapshot, returns None if deleted, else the error code
+    """
+    bucket.acquire()
+    try:
+        get_client("ec2").delete_snapshot(SnapshotId=snapshot_id)
+    except ClientError as e:
+        if is_throttling_error(e):
+            raise
+        error_code = e.response.get('Error', dict()).get('Code')
+        return None if error_code in ALREADY_DELETED_ERROR_CODES else error_code
+    return None
+
+
+def apply_plan(plan_path, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
+    """
+    Deletes the snapshots of the plan not deleted yet, returns (deleted snapshot ids, error code against failed
+    snapshot id, GB of the deleted snapshots)
+    """
+    checkpoint_path = get_checkpoint_path(plan_path)
+    plan = read_plan(plan_path)
+    done = read_checkpoint(checkpoint_path)
+    pending = [(snapshot_id, size) for snapshot_id, size in plan if snapshot_id not in done]
+    print(len(plan), "snapshots planned,", len(plan) - len(pending), "deleted by earlier runs,", len(pending), "to delete")
+
+    bucket = TokenBucket(rate, min(rate, 1.0))
+    deleted = [snapshot_id for snapshot_id, size in plan if snapshot_id in done]
+    reclaimed = sum(size for snapshot_id, size in plan if snapshot_id in done)
+    failed = dict()
+    with open(checkpoint_path, "a") as checkpoint_file, ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(delete_snapshot, snapshot_id, bucket): (snapshot_id, size) for snapshot_id, size in pending}
+        for future in as_completed(futures):
+            snapshot_id, size = futures[future]
+            try:
+                error_code = future.result()
+            except Exception as e:
+                error_code = str(e)
+            if error_code is None:
+                print("Deleted", snapshot_id)
+                deleted.append(snapshot_id)
+                reclaimed += size
+                checkpoint_file.write("{}\t{}\n".format(snapshot_id, DELETED))
+            else:
+                print("Failed to delete", snapshot_id, error_code)
+                failed[snapshot_id] = error_code
+                checkpoint_file.write("{}\t{}\n".format(snapshot_id, error_code))
+            checkpoint_file.flush()
+    return deleted, failed, reclaimed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deletes the snapshots which have none of the volume, instance or the AMI")
+    parser.add_argument("--apply", action="store_true", help="delete the snapshots of the plan file, instead of writing it")
+    parser.add_argument("--plan", default=DEFAULT_PLAN_PATH, help="path of the plan file")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="number of concurrent deletions")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="max deletions per second")
+    args = parser.parse_args()
+    # the workers share a single client
+    configure_pool_connections(args.workers)
+
+    if not args.apply:
+        print("Fetching snapshots...")
+        count, size = write_plan(args.plan)
+        print(count, "unreferenced snapshots ({} GB) written to {}, review it and run with --apply to delete them".format(size, args.plan))
+    else:
+        deleted, failed, reclaimed = apply_plan(args.plan, args.workers, args.rate)
+        print("\nDeleted", len(deleted), "snapshots, reclaiming up to", reclaimed, "GB")
+        if failed:
+            print("Failed to delete", len(failed), "snapshots:")
+            for snapshot_id, error_code in failed.items():
+                print(snapshot_id, error_code)
+
+
+if __name__ == "__main__":
+    main()
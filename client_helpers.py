@@ -0,0 +1,98 @@
+"""
+Helper functions to share AWS sessions and clients across all the modules of a process
+
+Creating a client takes tens of milliseconds and opens a connection pool of its own, so every module asks
+the shared registry instead, which creates a single client per (service, region, credentials) on first use.
+Connection pools are sized to the configured concurrency, so that parallel calls reuse kept alive connections
+instead of discarding them.
+"""
+
+import threading
+from throttle_helpers import create_client
+
+DEFAULT_MAX_POOL_CONNECTIONS = 10  # same as botocore
+
+
+class ClientRegistry:
+    """
+    Sessions against credentials and clients against (service, region, credentials), created on first use
+
+    max_pool_connections -- HTTP connections kept alive by every client, i.e. max concurrent calls of a client
+    """
+
+    def __init__(self, max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS):
+        self.max_pool_connections = max_pool_connections
+        self.sessions = dict()
+        self.clients = dict()
+        self.lock = threading.Lock()
+
+    def configure(self, max_pool_connections):
+        """
+        Grows the connection pools to max_pool_connections, the clients created so far are replaced
+        if they are smaller. Pools never shrink, clients serve the largest concurrency configured.
+        """
+        with self.lock:
+            if max_pool_connections > self.max_pool_connections:
+                self.clients.clear()
+                self.max_pool_connections = max_pool_connections
+
+    def get_session(self, credentials):
+        """
+        Returns boto3.Session of the given credentials, None for the default session
+        """
+        if not credentials:
+            return None
+        key = credentials["aws_access_key_id"]
+        if key not in self.sessions:
+            import boto3
+            self.sessions[key] = boto3.Session(**credentials)
+        return self.sessions[key]
+
+    def client(self, service_name, region_name=None, credentials=None):
+        """
+        Returns the shared client of the given service
+
+        region_name -- region name, None for the default region
+        credentials -- keyword arguments of boto3.Session (e.g. of an assumed role), None for the default credentials
+        """
+        key = (service_name, region_name, credentials["aws_access_key_id"] if credentials else None)
+        with self.lock:
+            # sessions are not thread safe, clients are created one at a time
+            if key not in self.clients:
+                self.clients[key] = create_client(service_name, region_name, self.get_session(credentials),
+                                                  self.max_pool_connections)
+            return self.clients[key]
+
+    def forget(self, credentials):
+        """
+        Drops the session and the clients of the given credentials, e.g. once they expired
+        """
+        key = credentials["aws_access_key_id"]
+        with self.lock:
+            self.sessions.pop(key, None)
+            for client_key in [client_key for client_key in self.clients if client_key[2] == key]:
+                del self.clients[client_key]
+
+
+registry = ClientRegistry()
+
+
+def configure_pool_connections(max_pool_connections):
+    """
+    Sizes the connection pools of the shared clients to the given number of concurrent calls (at least botocore's default)
+    """
+    registry.configure(max(DEFAULT_MAX_POOL_CONNECTIONS, max_pool_connections))
+
+
+def get_client(service_name, region_name=None, credentials=None):
+    """
+    Returns the shared client of the given service, see ClientRegistry.client
+    """
+    return registry.client(service_name, region_name, credentials)
+
+
+def forget_credentials(credentials):
+    """
+    Drops the shared session and clients of the given credentials, see ClientRegistry.forget
+    """
+    registry.forget(credentials)
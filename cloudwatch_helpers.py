@@ -0,0 +1,109 @@
+"""
+Helper functions to fetch CloudWatch Logs metrics of all the log groups of a region, or of just the top ones
+"""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+LOGS_NAMESPACE = 'AWS/Logs'
+INCOMING_BYTES = 'IncomingBytes'
+LOG_GROUP_DIMENSION = 'LogGroupName'
+MAX_METRIC_DATA_QUERIES = 500  # queries allowed in a single get_metric_data request
+DEFAULT_METRIC_DATA_CONCURRENCY = 4
+BYTES_IN_GB = 1024 * 1024 * 1024
+# Metrics Insights returns at most 500 groups, over at most the past 2 weeks
+INSIGHTS_MAX_LIMIT = 500
+INSIGHTS_MAX_DAYS = 14
+# SCHEMA keeps the query to the series with the log group dimension, leaving out the account level series
+INSIGHTS_TOP_QUERY = ('SELECT SUM({metric}) FROM SCHEMA("{namespace}", {dimension}) GROUP BY {dimension} '
+                      'ORDER BY SUM() DESC LIMIT {limit}')
+
+
+def get_log_group_metrics(client, metric_name=INCOMING_BYTES):
+    """
+    Returns {log group name: metric} of all the log groups with the given metric,
+    leaving out the metric of the whole region (which has no log group dimension)
+    """
+    metrics = dict()
+    kwargs = {'Namespace': LOGS_NAMESPACE, 'MetricName': metric_name}
+    while True:
+        response = client.list_metrics(**kwargs)
+        for metric in response.get('Metrics', []):
+            for dimension in metric.get('Dimensions', []):
+                if dimension['Name'] == LOG_GROUP_DIMENSION:
+                    metrics[dimension['Value']] = metric
+        if not response.get('NextToken'):
+            return metrics
+        kwargs['NextToken'] = response['NextToken']
+
+
+def get_query_id(index):
+    # ids must start with a lowercase letter, and the index maps the result back to its log group
+    return "q{}".format(index)
+
+
+def fetch_metric_data_batch(client, queries, start_time, end_time):
+    """
+    Returns MetricDataResults of all the pages of a single batch of queries
+    """
+    kwargs = {'MetricDataQueries': queries, 'StartTime': start_time, 'EndTime': end_time}
+    results = []
+    while True:
+        response = client.get_metric_data(**kwargs)
+        results.extend(response.get('MetricDataResults', []))
+        if not response.get('NextToken'):
+            return results
+        kwargs['NextToken'] = response['NextToken']
+
+
+def get_log_group_sums(client, metrics, start_time, end_time, max_workers=DEFAULT_METRIC_DATA_CONCURRENCY):
+    """
+    Returns {log group name: sum of its metric between start_time and end_time} for the given
+    {log group name: metric}, in the same order, leaving out the log groups without data.
+
+    Queries are sent MAX_METRIC_DATA_QUERIES per request, max_workers requests at a time.
+    """
+    log_groups = list(metrics)
+    period = end_time - start_time
+    queries = [{
+        "Id": get_query_id(index),
+        "MetricStat": {
+            "Metric": metrics[log_group],
+            "Period": period,
+            "Stat": "Sum",
+            "Unit": "Bytes"
+        }
+    } for index, log_group in enumerate(log_groups)]
+    batches = [queries[index:index + MAX_METRIC_DATA_QUERIES] for index in range(0, len(queries), MAX_METRIC_DATA_QUERIES)]
+
+    values = dict()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        # batches run in copies of the caller's context, so their calls are attributed to the caller's section
+        futures = [executor.submit(contextvars.copy_context().run, fetch_metric_data_batch, client, batch, start_time, end_time)
+                   for batch in batches]
+        for future in futures:
+            for result in future.result():
+                if result['StatusCode'] == "Complete" and result.get('Values'):
+                    index = int(result['Id'][1:])
+                    values[index] = values.get(index, 0.0) + sum(result['Values'])
+    return {log_groups[index]: values[index] for index in sorted(values)}
+
+
+def get_top_log_group_sums(client, limit, start_time, end_time, metric_name=INCOMING_BYTES):
+    """
+    Returns {log group name: sum of its metric between start_time and end_time} of the top limit log groups,
+    in descending order, with a single Metrics Insights query whatever the number of log groups
+    """
+    query = {
+        "Id": "top",
+        "Expression": INSIGHTS_TOP_QUERY.format(metric=metric_name, namespace=LOGS_NAMESPACE,
+                                                dimension=LOG_GROUP_DIMENSION, limit=limit),
+        "Period": end_time - start_time
+    }
+    sums = dict()
+    for result in fetch_metric_data_batch(client, [query], start_time, end_time):
+        # every group of the query is a result labelled with its log group, one labelled with the bare
+        # metric name would be the account level series
+        if result['StatusCode'] == "Complete" and result.get('Values') and result['Label'] != metric_name:
+            sums[result['Label']] = sums.get(result['Label'], 0.0) + sum(result['Values'])
+    return dict(sorted(sums.items(), key=lambda item: item[1], reverse=True)[:limit])
@@ -0,0 +1,125 @@
+"""
+Helper functions to cache Cost Explorer results on disk, one row per query and day
+
+Costs of a closed day don't change, so later runs only fetch the days missing from the cache,
+expired by its TTL, or still open (today and yesterday), and serve the rest from disk.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_CACHE_PATH = '.cost_explorer_cache.sqlite'
+DEFAULT_TTL_DAYS = 30
+DEFAULT_MAX_ENTRIES = 100000
+OPEN_DAYS = 2  # today and yesterday may still get costs added
+LOCK_TIMEOUT_SECONDS = 60
+DATE_FORMAT = "%Y-%m-%d"
+
+
+class CostCache:
+    """
+    SQLite cache of Cost Explorer groups against (query key, day)
+
+    path -- path of the SQLite file
+    ttl_days -- days after which a cached day is fetched again
+    max_entries -- max number of cached days, the least recently fetched ones are removed beyond it
+    namespace -- prefix of the query keys, to keep the costs of different accounts apart in a shared file
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_days=DEFAULT_TTL_DAYS, max_entries=DEFAULT_MAX_ENTRIES, namespace=""):
+        self.ttl_seconds = ttl_days * 24 * 60 * 60
+        self.max_entries = max_entries
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        # the file may be shared by the worker processes of an organization run
+        self.connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT_SECONDS, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS cost_days ("
+                "query_key TEXT NOT NULL, day TEXT NOT NULL, groups TEXT NOT NULL, fetched_at REAL NOT NULL, "
+                "PRIMARY KEY (query_key, day))"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS cost_days_fetched_at ON cost_days (fetched_at)")
+
+    def get_days(self, query_key, days):
+        """
+        Returns dict of groups against day, for the given days which are cached and not expired
+        """
+        oldest = time.time() - self.ttl_seconds
+        cached = dict()
+        with self.lock:
+            for index in range(0, len(days), 500):
+                batch = days[index:index+500]
+                rows = self.connection.execute(
+                    "SELECT day, groups FROM cost_days WHERE query_key = ? AND fetched_at >= ? AND day IN ({})".format(
+                        ", ".join("?" * len(batch))),
+                    [self.namespace + query_key, oldest] + batch
+                )
+                for day, groups in rows:
+                    cached[day] = json.loads(groups)
+        return cached
+
+    def put_days(self, query_key, day_groups):
+        """
+        Stores groups against day, and removes the least recently fetched days beyond max_entries
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO cost_days (query_key, day, groups, fetched_at) VALUES (?, ?, ?, ?)",
+                [(self.namespace + query_key, day, json.dumps(groups), now) for day, groups in day_groups.items()]
+            )
+            self.connection.execute(
+                "DELETE FROM cost_days WHERE rowid IN "
+                "(SELECT rowid FROM cost_days ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def close(self):
+        self.connection.close()
+
+
+def get_query_key(kwargs):
+    """
+    Returns cache key of get_cost_and_usage arguments, i.e. everything but the time period and granularity
+    """
+    return json.dumps({
+        "metrics": kwargs['Metrics'],
+        "group_by": kwargs['GroupBy'],
+        "filter": kwargs.get('Filter')
+    }, sort_keys=True)
+
+
+def get_days(start_date, end_date):
+    """
+    Returns list of days from start_date to end_date, end_date excluded
+    """
+    day = datetime.strptime(start_date, DATE_FORMAT)
+    end = datetime.strptime(end_date, DATE_FORMAT)
+    days = []
+    while day < end:
+        days.append(day.strftime(DATE_FORMAT))
+        day += timedelta(days=1)
+    return days
+
+
+def get_missing_ranges(days, missing_days):
+    """
+    Returns list of (start date, end date) of continuous runs of missing_days in days, end date excluded
+    """
+    ranges = []
+    start = None
+    for day in days:
+        if day in missing_days:
+            if start is None:
+                start = day
+        elif start is not None:
+            ranges.append((start, day))
+            start = None
+    if start is not None:
+        end = (datetime.strptime(days[-1], DATE_FORMAT) + timedelta(days=1)).strftime(DATE_FORMAT)
+        ranges.append((start, end))
+    return ranges
@@ -0,0 +1,184 @@
+"""
+Helper functions to fetch Cost Explorer data for all the report sections with as few requests as possible
+
+Sections describe the costs they need as requests of (start date, end date, service, tag key).
+Requests with the same time window are merged into a single get_cost_and_usage query grouped by
+SERVICE and the tag key, fetched once, and split back into the ResultsByTime each request would
+have got on its own.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from cost_cache_helpers import get_query_key, get_days, get_missing_ranges, OPEN_DAYS, DATE_FORMAT
+
+METRIC = 'UnblendedCost'
+# coarsest first. Sections summing costs over the whole window are answered by MONTHLY periods, the ones
+# leaving out negative costs (credits, refunds) per day need DAILY ones to get the same totals.
+GRANULARITIES = ['MONTHLY', 'DAILY']
+
+
+def get_cost_window(past_days):
+    """
+    Returns (start date, end date) of the past_days window, end date is excluded by Cost Explorer
+    """
+    start_date = (datetime.today() - timedelta(days=past_days)).strftime("%Y-%m-%d")
+    end_date = datetime.today().strftime("%Y-%m-%d")
+    return start_date, end_date
+
+
+def cost_request(start_date, end_date, service=None, tag_key=None, granularity=GRANULARITIES[0]):
+    """
+    Returns a request for costs between start_date and end_date,
+    grouped by service if tag_key is None, else grouped by values of tag_key for service.
+    granularity is the coarsest granularity the request can be answered with, a query merging
+    requests uses the finest of them.
+    """
+    return (start_date, end_date, service, tag_key, granularity)
+
+
+def plan_cost_queries(requests):
+    """
+    Merges requests into get_cost_and_usage queries, one per time window and tag key
+    (or one per time window if none of its requests group by tag).
+    Each query is a dict of get_cost_and_usage arguments along with the requests it answers.
+    """
+    windows = OrderedDict()
+    for request in requests:
+        windows.setdefault((request[0], request[1]), []).append(request)
+
+    queries = []
+    for (start_date, end_date), window_requests in windows.items():
+        service_requests = [request for request in window_requests if request[3] is None]
+        tag_requests = OrderedDict()
+        for request in window_requests:
+            if request[3] is not None:
+                tag_requests.setdefault(request[3], []).append(request)
+
+        if not tag_requests:
+            queries.append(build_cost_query(start_date, end_date, None, service_requests, None))
+            continue
+        for tag_key, key_requests in tag_requests.items():
+            services = sorted(set(request[2] for request in key_requests))
+            if service_requests:
+                # totals of all services are needed, so do not filter this query
+                key_requests = service_requests + key_requests
+                service_requests = []
+                services = None
+            queries.append(build_cost_query(start_date, end_date, tag_key, key_requests, services))
+    return queries
+
+
+def build_cost_query(start_date, end_date, tag_key, requests, services):
+    granularity = GRANULARITIES[max(GRANULARITIES.index(request[4]) for request in requests)]
+    group_by = [{'Type': 'DIMENSION', 'Key': 'SERVICE'}]
+    if tag_key is not None:
+        group_by.append({'Type': 'TAG', 'Key': tag_key})
+    kwargs = {
+        'TimePeriod': {'Start': start_date, 'End': end_date},
+        'Granularity': granularity,
+        'Metrics': [METRIC],
+        'GroupBy': group_by,
+    }
+    if services:
+        kwargs['Filter'] = {'Dimensions': {'Key': 'SERVICE', 'Values': services}}
+    return {"kwargs": kwargs, "requests": requests}
+
+
+def fetch_cost_query(client, query):
+    """
+    Returns ResultsByTime of all the pages of the query
+    """
+    response = client.get_cost_and_usage(**query["kwargs"])
+    results = response.get('ResultsByTime', [])
+    next_token = response.get('NextPageToken')
+    while next_token is not None:
+        response = client.get_cost_and_usage(NextPageToken=next_token, **query["kwargs"])
+        results.extend(response['ResultsByTime'])
+        next_token = response.get('NextPageToken')
+    return results
+
+
+def split_cost_results(query, results):
+    """
+    Returns ResultsByTime of every request of the query against the request,
+    in the same shape as get_cost_and_usage would have returned for the request alone
+    """
+    # sum of cost per period against (service, tag key) group, pages may split a period
+    periods = OrderedDict()
+    for interval in results:
+        groups = periods.setdefault(interval['TimePeriod']['Start'], (interval['TimePeriod'], OrderedDict()))[1]
+        for group_row in interval.get('Groups', []):
+            keys = tuple(group_row['Keys'])
+            groups[keys] = groups.get(keys, 0.0) + float(group_row['Metrics'][METRIC]['Amount'])
+
+    split_results = dict()
+    for request in query["requests"]:
+        service, tag_key = request[2], request[3]
+        request_results = []
+        for time_period, groups in periods.values():
+            request_groups = OrderedDict()
+            for keys, amount in groups.items():
+                if tag_key is None:
+                    key = keys[0]
+                elif keys[0] == service:
+                    key = keys[1]
+                else:
+                    continue
+                request_groups[key] = request_groups.get(key, 0.0) + amount
+            request_results.append({
+                'TimePeriod': time_period,
+                'Groups': [{'Keys': [key], 'Metrics': {METRIC: {'Amount': amount}}} for key, amount in request_groups.items()]
+            })
+        split_results[request] = request_results
+    return split_results
+
+
+def fetch_cached_cost_query(client, query, cache):
+    """
+    Returns daily ResultsByTime of the query, fetching only the days missing from the cache
+    (or still open) with DAILY queries
+    """
+    kwargs = query["kwargs"]
+    metric = kwargs['Metrics'][0]
+    query_key = get_query_key(kwargs)
+    days = get_days(kwargs['TimePeriod']['Start'], kwargs['TimePeriod']['End'])
+    first_open_day = (datetime.today() - timedelta(days=OPEN_DAYS - 1)).strftime(DATE_FORMAT)
+
+    day_groups = cache.get_days(query_key, [day for day in days if day < first_open_day])
+    missing_days = set(day for day in days if day not in day_groups)
+    for start_date, end_date in get_missing_ranges(days, missing_days):
+        print("Fetching Cost Explorer data from", start_date, "to", end_date, "(not cached)")
+        range_kwargs = dict(kwargs, TimePeriod={'Start': start_date, 'End': end_date}, Granularity='DAILY')
+        fetched = dict((day, []) for day in get_days(start_date, end_date))
+        for interval in fetch_cost_query(client, {"kwargs": range_kwargs}):
+            groups = fetched.setdefault(interval['TimePeriod']['Start'], [])
+            for group_row in interval.get('Groups', []):
+                groups.append([group_row['Keys'], float(group_row['Metrics'][metric]['Amount'])])
+        cache.put_days(query_key, fetched)
+        day_groups.update(fetched)
+
+    results = []
+    for day in days:
+        next_day = (datetime.strptime(day, DATE_FORMAT) + timedelta(days=1)).strftime(DATE_FORMAT)
+        results.append({
+            'TimePeriod': {'Start': day, 'End': next_day},
+            'Groups': [{'Keys': keys, 'Metrics': {metric: {'Amount': amount}}} for keys, amount in day_groups.get(day, [])]
+        })
+    return results
+
+
+def fetch_cost_data(client, requests, cache=None):
+    """
+    Returns ResultsByTime against each of the requests, using as few get_cost_and_usage queries as possible.
+    If a CostCache is given, only the days missing from it are fetched.
+    """
+    cost_data = dict()
+    for query in plan_cost_queries(list(OrderedDict.fromkeys(requests))):
+        print("Fetching Cost Explorer data from", query["kwargs"]['TimePeriod']['Start'], "to",
+              query["kwargs"]['TimePeriod']['End'], "grouped by", ", ".join(group['Key'] for group in query["kwargs"]['GroupBy']))
+        if cache is not None:
+            results = fetch_cached_cost_query(client, query, cache)
+        else:
+            results = fetch_cost_query(client, query)
+        cost_data.update(split_cost_results(query, results))
+    return cost_data
@@ -1,222 +1,209 @@
 """
-Generates report.xlsx file, based on the options specified on config.json file
+Generates report.xlsx file (and/or CSV, JSON Lines, Parquet outputs), based on the options specified on config.json file
+
+Every enabled section of config.json is collected by its own job, jobs run concurrently
+as soon as the sections they depend on are done, and the sheets are written to the
+workbook in the order of config.json once all of them are collected.
+
+With multiple regions, regional sections get a job per region using that region's clients,
+and their sheets are merged into one sheet with a Region column. Global calls (Cost Explorer,
+S3 bucket listing) are still made only once.
+
+With an organization, every account is collected the same way in its own worker process,
+with the credentials of a role assumed in it, and the sheets are merged with an Account column.
+
+Importing the module has no side effect, collect_rows returns the rows of sections for use as a library,
+and main is the command line entry point.
 """
 
-import boto3
-import xlsxwriter
+import argparse
 import json
+import time
+IMPORT_STARTED = time.monotonic()  # start-up time of the report is measured from here, see main
 from datetime import datetime, timedelta
-from ebs_helpers import get_snapshots, get_available_volumes
-from fetch_helpers import get_lambda_functions, get_dynamodb_tables
-from fetch_helpers import get_ec2_reservations
-from fetch_helpers import get_kinesis_streams, get_firehose_delivery_streams
+from ebs_helpers import get_snapshots, get_available_volumes, clear_cache, DEFAULT_PAGE_SIZE
+from tag_helpers import fetch_tags_concurrently, get_tags_dict_from_list, DEFAULT_CONCURRENCY
+from tag_helpers import get_lambda_function_tags, get_dynamodb_table_tags
+from tag_helpers import get_kinesis_stream_tags, get_firehose_delivery_stream_tags, get_s3_bucket_tags
+from tag_helpers import get_bulk_tags_index, indexed_tags_getter, BULK_TAG_RESOURCE_TYPES
+from arn_helpers import get_caller_details, build_arn
+from sheet_helpers import Sheet
+from sheet_helpers import MAIN_HEADING, GENERIC_CELL, GREEN_TEXT_CELL, RED_TEXT_CELL
+from sheet_helpers import merge_sheets
+from job_helpers import run_jobs, DEFAULT_MAX_WORKERS
+from output_helpers import get_sinks, write_sheets, RecordListSink
+from region_helpers import get_regions, ClientPool
+from throttle_helpers import configure_rate_limits, is_throttling_error
+from client_helpers import configure_pool_connections
+from metrics_helpers import recorder, write_stats_file, get_stats_sheet
+from account_helpers import assume_account_role, DEFAULT_MAX_PROCESSES
+from cloudwatch_helpers import get_log_group_metrics, get_log_group_sums, get_top_log_group_sums
+from cloudwatch_helpers import DEFAULT_METRIC_DATA_CONCURRENCY, BYTES_IN_GB, INSIGHTS_MAX_LIMIT, INSIGHTS_MAX_DAYS
+from cost_explorer_helpers import get_cost_window, cost_request, fetch_cost_data, GRANULARITIES
+from cube_helpers import CostCube
+from inventory_helpers import InventoryStore, stored_tags_getter, DEFAULT_INVENTORY_PATH, DEFAULT_INVENTORY_TTL_DAYS
+from cost_cache_helpers import CostCache, DEFAULT_CACHE_PATH, DEFAULT_TTL_DAYS, DEFAULT_MAX_ENTRIES
 from collections import defaultdict
+from botocore.exceptions import ClientError
 
 # constants
-OUTPUT_FILE_NAME = 'report.xlsx'
-UNIQUE_ID_SIZE = 10
-MAIN_HEADING_BG_COLOR = '#0080ff'
-MAIN_HEADING_FONT_COLOR = '#ffffff'
-MAIN_HEADING_FONT_SIZE = 13
-SUB_HEADING_BG_COLOR = '#969696'
-SUB_HEADING_FONT_COLOR = '#ffffff'
-SUB_HEADING_FONT_SIZE = 13
-CELL_FONT_SIZE = 13
-GREEN_FONT_COLOR = '#037d50'
-RED_FONT_COLOR = '#cc0000'
-
-workbook = xlsxwriter.Workbook(OUTPUT_FILE_NAME)
-main_heading = workbook.add_format({
-    'font_color': MAIN_HEADING_FONT_COLOR,
-    'bg_color': MAIN_HEADING_BG_COLOR,
-    'valign': 'vcenter', 'border': 1,
-    'font_size': MAIN_HEADING_FONT_SIZE
-})
-sub_heading = workbook.add_format({
-    'font_color': SUB_HEADING_FONT_COLOR,
-    'bg_color': SUB_HEADING_BG_COLOR,
-    'valign': 'vcenter', 'border': 1,
-    'font_size': SUB_HEADING_FONT_SIZE
-})
-generic_cell = workbook.add_format({
-    'valign': 'vcenter', 'border': 1,
-    'font_size': CELL_FONT_SIZE
-})
-green_text_cell = workbook.add_format({
-    'valign': 'vcenter', 'border': 1,
-    'font_size': CELL_FONT_SIZE,
-    'font_color': GREEN_FONT_COLOR
-})
-red_text_cell = workbook.add_format({
-    'valign': 'vcenter', 'border': 1,
-    'font_size': CELL_FONT_SIZE,
-    'font_color': RED_FONT_COLOR
-})
-
-print("Loading config.json file....")
-config = dict()
-with open("config.json") as json_file:
-    config = json.load(json_file)
-print("configuration loaded!")
-
-
-def generate_unique_string():
-    import random
-    import string
-    return "".join(random.choices(string.ascii_lowercase, k=UNIQUE_ID_SIZE))
-
-
-def add_untagged_in_worksheet(worksheet, row, resource_type, resource_name, tags_to_look, tags):
+DEFAULT_CONFIG_PATH = 'config.json'
+DEFAULT_STATS_PATH = 'run_stats.json'
+GLOBAL_LABEL = 'global'
+# collection modes of storage_cloudwatch_log_groups
+INSIGHTS_MODE = 'insights'
+ENUMERATE_MODE = 'enumerate'
+
+
+def add_untagged_in_sheet(sheet, resource_type, resource_name, tags_to_look, tags):
     to_add = False
     values = [resource_type, resource_name]
+    styles = [GENERIC_CELL, GENERIC_CELL]
     for key in tags_to_look:
         if (key not in tags) or (len(tags[key]) < 3):
             to_add = True
-            values.append(False)
+            values.append("UNAVAILABLE")
+            styles.append(RED_TEXT_CELL)
         else:
-            values.append(True)
+            values.append("AVAILABLE")
+            styles.append(GREEN_TEXT_CELL)
     if to_add:
-        col = 0
-        for value in values:
-            if isinstance(value, bool):
-                if value:
-                    worksheet.write(row, col, "AVAILABLE", green_text_cell)
-                else:
-                    worksheet.write(row, col, "UNAVAILABLE", red_text_cell)
-            else:
-                worksheet.write(row, col, value, generic_cell)
-            col += 1
-        row += 1
-    return row
+        sheet.add_row(values, styles)
 
 
-def get_tags_dict_from_list(tags_list):
-    tags = dict()
-    for tag_dict in tag_list:
-        tags[tag_dict['Key']] = tag_dict['Value']
-    return tags
+def describe_in_regions(pools, describe, service=None):
+    """
+    Returns describe(catalog) for the first region (of pools) where it succeeds,
+    for resources known only by name, raises the error of the last region if none
+
+    service -- service name of the calls made by describe, see throttle_helpers.is_throttling_code
+    """
+    error = None
+    for pool in pools:
+        try:
+            return describe(pool.catalog)
+        except Exception as e:
+            if is_throttling_error(e, service):
+                raise
+            error = e
+    raise error
 
 
-# conditional checks for all parameters
-if config["expensive_services"]["enabled"]:
-    cost_percentage = config["expensive_services"]["cost_percentage"]
-    past_days = config["expensive_services"]["past_days"]
+def collect_expensive_services(section_config, context):
+    cost_percentage = section_config["cost_percentage"]
+    past_days = section_config["past_days"]
     # expensive services
     print("\nLooking for expensive services")
     print("---")
-    start_date = (datetime.today() - timedelta(days=past_days)).strftime("%Y-%m-%d")
-    end_date = datetime.today().strftime("%Y-%m-%d")
 
-    services_worksheet = workbook.add_worksheet("{}% Cost Services".format(cost_percentage))
-    row = 0
+    services_sheet = Sheet("{}% Cost Services".format(cost_percentage))
     # add headings
-    services_worksheet.write(row, 0, "Service", main_heading)
-    services_worksheet.write(row, 1, "Cost (in USD) for past {} days".format(past_days), main_heading)
+    services_sheet.add_row(["Service", "Cost (in USD) for past {} days".format(past_days)], MAIN_HEADING)
     # set length of columns
-    services_worksheet.set_column(0, 1, 60)
-    row += 1
-    # create cost explorer client
-    client = boto3.client('ce')
-    token = None
-    results = []
-    while True:
-        if token:
-            kwargs = {'NextPageToken': token}
-        else:
-            kwargs = {}
-        data = client.get_cost_and_usage(TimePeriod={'Start': start_date, 'End': end_date}, Granularity='DAILY',
-                                         Metrics=['UnblendedCost'], GroupBy=[{'Type': 'DIMENSION', 'Key': 'SERVICE'}],
-                                         **kwargs)
-        results += data['ResultsByTime']
-        token = data.get('NextPageToken')
-        if not token:
-            break
-    service_to_cost = defaultdict(int)
-    total_cost = 0
-    for result in results:
-        for group in result.get("Groups", []):
-            service_name = group["Keys"][0]
-            cost = float(group["Metrics"]["UnblendedCost"]["Amount"])
-            if cost > 0:
-                service_to_cost[service_name] += cost
-                total_cost += cost
-
-    sorted_services = sorted(service_to_cost.items(), key=lambda x: x[1], reverse=True)
-
-    target_amount = (cost_percentage / 100.0) * total_cost
-    current_amount = 0
-    for service_name, cost in sorted_services:
-        services_worksheet.write(row, 0, service_name, generic_cell)
-        services_worksheet.write(row, 1, cost, generic_cell)
-        row += 1
-        current_amount += cost
-        if current_amount > target_amount:
-            break
+    services_sheet.set_column(0, 1, 60)
+    # costs fetched by the cost_explorer job, services without any positive cost are left out
+    cost_cube = context["dependencies"]["cost_explorer"][context["cost_request"]]
+    total_cost = cost_cube.total(positive_only=True)
+    for service_name, cost in cost_cube.pareto(cost_percentage, positive_only=True):
+        services_sheet.add_row([service_name, cost])
     if total_cost > 0:
-        services_worksheet.write(row, 0, "ALL SERVICES", sub_heading)
-        services_worksheet.write(row, 1, total_cost, sub_heading)
-        row += 1
+        services_sheet.add_total_row(["ALL SERVICES", total_cost])
+    return services_sheet
 
 
-if config["untagged_resources"]["enabled"]:
-    tags_to_look = config["untagged_resources"]["tags"]
+def collect_untagged_resources(section_config, context):
+    tags_to_look = section_config["tags"]
+    # buckets are listed only by the global job when running over multiple regions
+    include_regional = context.get("include_regional", True)
+    include_global = context.get("include_global", True)
     # untagged resources
     print("\nLooking for untagged resources")
     print("---")
 
-    untagged_worksheet = workbook.add_worksheet("Untagged Resources")
-    row = 0
+    untagged_sheet = Sheet("Untagged Resources")
     # add headings
-    untagged_worksheet.write(row, 0, "Resource", main_heading)
-    untagged_worksheet.write(row, 1, "Name", main_heading)
-    col = 2
-    for key in tags_to_look:
-        untagged_worksheet.write(row, col, key, main_heading)
-        col += 1
-    row += 1
+    untagged_sheet.add_row(["Resource", "Name"] + list(tags_to_look), MAIN_HEADING)
     # set length of columns
-    untagged_worksheet.set_column(0, 0, 30)
-    untagged_worksheet.set_column(1, 1, 70)
-    untagged_worksheet.set_column(2, len(tags_to_look)+1, 14)
+    untagged_sheet.set_column(0, 0, 30)
+    untagged_sheet.set_column(1, 1, 70)
+    untagged_sheet.set_column(2, len(tags_to_look)+1, 14)
+    pool = context["pool"]
+
+    # --------------------------------#
+    # bulk tag scan, if enabled       #
+    # --------------------------------#
+    tags_index = None
+    caller = None
+    if section_config.get("bulk_tag_scan", False):
+        print("\nFetching tags in bulk...might take a while")
+        try:
+            client = pool.client("resourcegroupstaggingapi")
+            caller = get_caller_details(pool.client("sts"))
+            resource_types = [resource_type for resource_type in BULK_TAG_RESOURCE_TYPES
+                              if (include_global if resource_type == "s3" else include_regional)]
+            tags_index = get_bulk_tags_index(client, resource_types)
+        except Exception as e:
+            print(e)
+            print("Bulk tag scan failed, fetching tags per resource")
+            tags_index = None
+
+    # ARNs of the resources kept in the inventory store are built with the caller's account
+    if pool.inventory is not None and caller is None:
+        caller = get_caller_details(pool.client("sts"))
+
+    if include_regional:
+        collect_untagged_regional_resources(untagged_sheet, section_config, pool, tags_index, caller)
+    if include_global:
+        collect_untagged_global_resources(untagged_sheet, section_config, pool, tags_index, caller)
+    return untagged_sheet
+
+
+def collect_untagged_regional_resources(untagged_sheet, section_config, pool, tags_index, caller):
+    tags_to_look = section_config["tags"]
+    concurrency = section_config.get("concurrency", dict())
+    region = pool.client("resourcegroupstaggingapi").meta.region_name
 
     # ------------------#
     # search in lambdas #
     # ------------------#
     print("\nFetching Lambda Functions...might take a while")
-    client = boto3.client("lambda")
-    # look for tags and add in worksheet if required
-    for function in get_lambda_functions(client):
-        tags = client.list_tags(Resource=function['FunctionArn']).get('Tags', dict())
+    client = pool.client("lambda")
+    get_tags = get_lambda_function_tags
+    if tags_index is not None:
+        get_tags = indexed_tags_getter(tags_index, lambda function: function['FunctionArn'])
+    elif pool.inventory is not None:
+        get_tags = stored_tags_getter(pool.inventory, "Lambda Function", lambda function: function['FunctionArn'],
+                                      lambda function: (function.get('LastModified'), function.get('RevisionId')), get_tags)
+    # look for tags and add in sheet if required
+    for function, tags in fetch_tags_concurrently(client, pool.catalog.functions(), get_tags, concurrency.get("lambda", DEFAULT_CONCURRENCY)):
         function_name = function['FunctionName']
         print("Checking for Lambda Function", function_name)
-        row = add_untagged_in_worksheet(untagged_worksheet, row, "Lambda Function", function_name, tags_to_look, tags)
+        add_untagged_in_sheet(untagged_sheet, "Lambda Function", function_name, tags_to_look, tags)
 
     # -------------------#
     # search in dynamodb #
     # -------------------#
     print("\nFetching DynamoDB Tables...might take a while")
-    client = boto3.client("dynamodb")
-    # look for tags and add in worksheet if required
-    for table in get_dynamodb_tables(client):
+    client = pool.client("dynamodb")
+    # table ARNs are taken from the catalog, whose descriptions are shared with the other DynamoDB reports
+    get_tags = lambda client, table: get_dynamodb_table_tags(client, table, pool.catalog.table(table)['TableArn'])
+    if tags_index is not None:
+        get_tags = indexed_tags_getter(tags_index, lambda table: build_arn("DynamoDB Table", table, region, caller["account_id"], caller["partition"]))
+    elif pool.inventory is not None:
+        # ListTables returns names only, so stored tables go by the TTL alone and are described only when fetched
+        get_tags = stored_tags_getter(pool.inventory, "DynamoDB Table", lambda table: build_arn("DynamoDB Table", table, region, caller["account_id"], caller["partition"]),
+                                      lambda table: None, get_tags)
+    # look for tags and add in sheet if required
+    for table, tags in fetch_tags_concurrently(client, pool.catalog.tables(), get_tags, concurrency.get("dynamodb", DEFAULT_CONCURRENCY)):
         print("Checking for DynamoDB Table", table)
-        table_arn = client.describe_table(TableName=table)['Table']['TableArn']
-        tag_response = client.list_tags_of_resource(ResourceArn=table_arn)
-        tag_list = tag_response.get('Tags', [])
-        next_token = tag_response.get('NextToken')
-        while next_token is not None:
-            tag_response = client.list_tags_of_resource(ResourceArn=table_arn, NextToken=next_token)
-            tag_list.extend(tag_response['Tags'])
-            next_token = tag_response.get('NextToken')
-        tags = get_tags_dict_from_list(tag_list)
-        row = add_untagged_in_worksheet(untagged_worksheet, row, "DynamoDB Table", table, tags_to_look, tags)
+        add_untagged_in_sheet(untagged_sheet, "DynamoDB Table", table, tags_to_look, tags)
 
     # ------------------#
     # search in EC2     #
     # ------------------#
     print("\nFetching EC2 Instances...might take a while")
-    client = boto3.client("ec2")
-    # look for tags and add in worksheet if required
-    for reservation in get_ec2_reservations(client):
+    # look for tags and add in sheet if required
+    for reservation in pool.catalog.reservations():
         for instance in reservation['Instances']:
             instance_identifier = instance['InstanceId']
             print("Checking for EC2 Instance", instance_identifier)
@@ -224,464 +211,331 @@ if config["untagged_resources"]["enabled"]:
             tags = get_tags_dict_from_list(tag_list)
             if tags.get('Name') is not None:
                 instance_identifier += (" (" + tags['Name'] + ")")
-            row = add_untagged_in_worksheet(untagged_worksheet, row, "EC2 Instance", instance_identifier, tags_to_look, tags)
+            add_untagged_in_sheet(untagged_sheet, "EC2 Instance", instance_identifier, tags_to_look, tags)
 
     # ------------------#
     # search in Kinesis #
     # ------------------#
     print("\nFetching Kinesis Streams...might take a while")
-    client = boto3.client("kinesis")
-    # look for tags and add in worksheet if required
-    for stream in get_kinesis_streams(client):
+    client = pool.client("kinesis")
+    get_tags = get_kinesis_stream_tags
+    if tags_index is not None:
+        get_tags = indexed_tags_getter(tags_index, lambda stream: build_arn("Kinesis Stream", stream, region, caller["account_id"], caller["partition"]))
+    elif pool.inventory is not None:
+        # listings only have the names of the streams, so their tags are fetched again after the TTL
+        get_tags = stored_tags_getter(pool.inventory, "Kinesis Stream", lambda stream: build_arn("Kinesis Stream", stream, region, caller["account_id"], caller["partition"]),
+                                      lambda stream: None, get_tags)
+    # look for tags and add in sheet if required
+    for stream, tags in fetch_tags_concurrently(client, pool.catalog.streams(), get_tags, concurrency.get("kinesis", DEFAULT_CONCURRENCY)):
         print("Checking for Kinesis Stream", stream)
-        tag_response = client.list_tags_for_stream(StreamName=stream)
-        tag_list = tag_response['Tags']
-        has_more_tags = tag_response.get('HasMoreTags', False)
-        while has_more_tags:
-            tag_response = client.list_tags_for_stream(StreamName=stream, ExclusiveStartTagKey=tag_list[-1]['Key'])
-            tag_list.extend(tag_response['Tags'])
-            has_more_tags = tag_response.get('HasMoreTags', False)
-        tags = get_tags_dict_from_list(tag_list)
-        row = add_untagged_in_worksheet(untagged_worksheet, row, "Kinesis Stream", stream, tags_to_look, tags)
+        add_untagged_in_sheet(untagged_sheet, "Kinesis Stream", stream, tags_to_look, tags)
 
     # -------------------#
     # search in Firehose #
     # -------------------#
     print("\nFetching Firehose Delivery Streams...might take a while")
-    client = boto3.client("firehose")
-    # look for tags and add in worksheet if required
-    for stream in get_firehose_delivery_streams(client):
+    client = pool.client("firehose")
+    get_tags = get_firehose_delivery_stream_tags
+    if tags_index is not None:
+        get_tags = indexed_tags_getter(tags_index, lambda stream: build_arn("Firehose Delivery Stream", stream, region, caller["account_id"], caller["partition"]))
+    elif pool.inventory is not None:
+        # listings only have the names of the streams, so their tags are fetched again after the TTL
+        get_tags = stored_tags_getter(pool.inventory, "Firehose Delivery Stream", lambda stream: build_arn("Firehose Delivery Stream", stream, region, caller["account_id"], caller["partition"]),
+                                      lambda stream: None, get_tags)
+    # look for tags and add in sheet if required
+    for stream, tags in fetch_tags_concurrently(client, pool.catalog.delivery_streams(), get_tags, concurrency.get("firehose", DEFAULT_CONCURRENCY)):
         print("Checking for Firehose Delivery Streams", stream)
-        tag_response = client.list_tags_for_delivery_stream(DeliveryStreamName=stream)
-        tag_list = tag_response['Tags']
-        has_more_tags = tag_response.get('HasMoreTags', False)
-        while has_more_tags:
-            tag_response = client.list_tags_for_delivery_stream(DeliveryStreamName=stream, ExclusiveStartTagKey=tag_list[-1]['Key'])
-            tag_list.extend(tag_response['Tags'])
-            has_more_tags = tag_response.get('HasMoreTags', False)
-        tags = get_tags_dict_from_list(tag_list)
-        row = add_untagged_in_worksheet(untagged_worksheet, row, "Firehose Delivery Stream", stream, tags_to_look, tags)
+        add_untagged_in_sheet(untagged_sheet, "Firehose Delivery Stream", stream, tags_to_look, tags)
+
+
+def collect_untagged_global_resources(untagged_sheet, section_config, pool, tags_index, caller):
+    tags_to_look = section_config["tags"]
+    concurrency = section_config.get("concurrency", dict())
+    region = pool.client("resourcegroupstaggingapi").meta.region_name
 
     # ------------------#
     #    search in S3   #
     # ------------------#
     print("\nFetching S3 Buckets...might take a while")
-    client = boto3.client("s3")
-    # fetch all S3 buckets and store in "buckets"
-    buckets = client.list_buckets()['Buckets']
-    # look for tags and add in worksheet if required
-    for bucket in buckets:
-        bucket_name = bucket['Name']
+    client = pool.client("s3")
+    # fetch all S3 bucket names and store in "buckets"
+    buckets = pool.catalog.buckets()
+    get_tags = get_s3_bucket_tags
+    if tags_index is not None:
+        # buckets outside the scanned region are missing from the index, fetch those per bucket
+        get_tags = indexed_tags_getter(tags_index, lambda bucket_name: build_arn("S3 Bucket", bucket_name, region, caller["account_id"], caller["partition"]), get_s3_bucket_tags)
+    elif pool.inventory is not None:
+        get_tags = stored_tags_getter(pool.inventory, "S3 Bucket", lambda bucket_name: build_arn("S3 Bucket", bucket_name, region, caller["account_id"], caller["partition"]),
+                                      pool.catalog.bucket_creation_date, get_tags)
+    # look for tags and add in sheet if required
+    for bucket_name, tags in fetch_tags_concurrently(client, buckets, get_tags, concurrency.get("s3", DEFAULT_CONCURRENCY)):
         print("Checking for S3 Bucket", bucket_name)
-        try:
-            tag_list = client.get_bucket_tagging(Bucket=bucket_name)['TagSet']
-        except Exception as e:
-            print(e)
-            tag_list = []
-        tags = get_tags_dict_from_list(tag_list)
-        row = add_untagged_in_worksheet(untagged_worksheet, row, "S3 Bucket", bucket_name, tags_to_look, tags)
+        add_untagged_in_sheet(untagged_sheet, "S3 Bucket", bucket_name, tags_to_look, tags)
+
 
-if config["unreferenced_snapshots"]["enabled"]:
+def collect_unreferenced_snapshots(section_config, context):
     # Unreferenced Snapshots
     print("\nLooking for unreferenced snapshots")
     print("---")
 
-    snapshots_worksheet = workbook.add_worksheet("Unreferenced Snapshots")
-    row = 0
+    snapshots_sheet = Sheet("Unreferenced Snapshots")
     # add headings
-    snapshots_worksheet.write(row, 0, "Snapshot ID", main_heading)
-    snapshots_worksheet.write(row, 1, "Size", main_heading)
-    snapshots_worksheet.write(row, 2, "Start Time", main_heading)
-    snapshots_worksheet.write(row, 3, "Volume", main_heading)
-    snapshots_worksheet.write(row, 4, "AMI", main_heading)
-    snapshots_worksheet.write(row, 5, "Instance", main_heading)
-    snapshots_worksheet.write(row, 6, "Volume ID", main_heading)
-    snapshots_worksheet.write(row, 7, "Volume Name", main_heading)
-    snapshots_worksheet.write(row, 8, "AMI ID", main_heading)
-    snapshots_worksheet.write(row, 9, "AMI Name", main_heading)
-    snapshots_worksheet.write(row, 10, "Instance ID", main_heading)
-    snapshots_worksheet.write(row, 11, "Instance Name", main_heading)
+    snapshots_sheet.add_row(["Snapshot ID", "Size", "Start Time", "Volume", "AMI", "Instance", "Volume ID",
+                             "Volume Name", "AMI ID", "AMI Name", "Instance ID", "Instance Name"], MAIN_HEADING)
     # set length of columns
-    snapshots_worksheet.set_column(0, 11, 30)
+    snapshots_sheet.set_column(0, 11, 30)
 
-    row += 1
     print("Fetching snapshots...might take a while")
-    for snapshot in get_snapshots():
+    for snapshot in get_snapshots(section_config.get("page_size", DEFAULT_PAGE_SIZE), context["pool"].client("ec2"),
+                              context["pool"].catalog.reservations()):
         print("Checking for snapshot", snapshot['id'])
         if (not snapshot['volume_exists']) or (not snapshot['ami_exists']) or (not snapshot['instance_exists']):
-            snapshots_worksheet.write(row, 0, snapshot['id'], generic_cell)
-            snapshots_worksheet.write(row, 1, str(snapshot['size'])+" GB", generic_cell)
-            snapshots_worksheet.write(row, 2, str(snapshot['start_time']), generic_cell)
-            snapshots_worksheet.write(row, 3, snapshot['volume_exists'], green_text_cell if snapshot['volume_exists'] else red_text_cell)
-            snapshots_worksheet.write(row, 4, snapshot['ami_exists'], green_text_cell if snapshot['ami_exists'] else red_text_cell)
-            snapshots_worksheet.write(row, 5, snapshot['instance_exists'], green_text_cell if snapshot['instance_exists'] else red_text_cell)
-            snapshots_worksheet.write(row, 6, snapshot['volume_id'], generic_cell)
-            snapshots_worksheet.write(row, 7, snapshot['volume_name'], generic_cell)
-            snapshots_worksheet.write(row, 8, snapshot['ami_id'], generic_cell)
-            snapshots_worksheet.write(row, 9, snapshot['ami_name'], generic_cell)
-            snapshots_worksheet.write(row, 10, snapshot['instance_id'], generic_cell)
-            snapshots_worksheet.write(row, 11, snapshot['instance_name'], generic_cell)
-            row += 1
-
-if config["unattached_volumes"]["enabled"]:
+            snapshots_sheet.add_row([
+                snapshot['id'], str(snapshot['size'])+" GB", str(snapshot['start_time']),
+                snapshot['volume_exists'], snapshot['ami_exists'], snapshot['instance_exists'],
+                snapshot['volume_id'], snapshot['volume_name'], snapshot['ami_id'], snapshot['ami_name'],
+                snapshot['instance_id'], snapshot['instance_name']
+            ], [
+                GENERIC_CELL, GENERIC_CELL, GENERIC_CELL,
+                GREEN_TEXT_CELL if snapshot['volume_exists'] else RED_TEXT_CELL,
+                GREEN_TEXT_CELL if snapshot['ami_exists'] else RED_TEXT_CELL,
+                GREEN_TEXT_CELL if snapshot['instance_exists'] else RED_TEXT_CELL,
+                GENERIC_CELL, GENERIC_CELL, GENERIC_CELL, GENERIC_CELL, GENERIC_CELL, GENERIC_CELL
+            ])
+    return snapshots_sheet
+
+
+def collect_unattached_volumes(section_config, context):
     # Unattached Volumes
     print("\nLooking for unattached volumes")
     print("---")
 
-    volumes_worksheet = workbook.add_worksheet("Unattached Volumes")
-    row = 0
+    volumes_sheet = Sheet("Unattached Volumes")
     # add headings
-    volumes_worksheet.write(row, 0, "Volume ID", main_heading)
-    volumes_worksheet.write(row, 1, "Create Time", main_heading)
-    volumes_worksheet.write(row, 2, "Status", main_heading)
-    volumes_worksheet.write(row, 3, "Size", main_heading)
-    volumes_worksheet.write(row, 4, "Snapshot ID", main_heading)
-    volumes_worksheet.write(row, 5, "Tags", main_heading)
+    volumes_sheet.add_row(["Volume ID", "Create Time", "Status", "Size", "Snapshot ID", "Tags"], MAIN_HEADING)
     # set length of columns
-    volumes_worksheet.set_column(0, 4, 30)
-    volumes_worksheet.set_column(5, 5, 60)
+    volumes_sheet.set_column(0, 4, 30)
+    volumes_sheet.set_column(5, 5, 60)
 
-    row += 1
     print("Fetching volumes...might take a while")
-    for volume in get_available_volumes():
+    for volume in get_available_volumes(section_config.get("page_size", DEFAULT_PAGE_SIZE), context["pool"].client("ec2")):
         print("Checking for volume", volume['id'])
-        volumes_worksheet.write(row, 0, volume['id'], generic_cell)
-        volumes_worksheet.write(row, 1, volume['create_time'], generic_cell)
-        volumes_worksheet.write(row, 2, volume['status'], generic_cell)
-        volumes_worksheet.write(row, 3, volume['size'], generic_cell)
-        volumes_worksheet.write(row, 4, volume['snapshot_id'], generic_cell)
-        volumes_worksheet.write(row, 5, volume['tags'], generic_cell)
-        row += 1
-
-if config["expensive_lambda_functions"]["enabled"]:
+        volumes_sheet.add_row([volume['id'], volume['create_time'], volume['status'], volume['size'],
+                               volume['snapshot_id'], volume['tags']])
+    return volumes_sheet
+
+
+def collect_expensive_lambda_functions(section_config, context):
     # Top most expensive lambdas
     print("\nLooking for expensive lambda functions...")
     print("---")
 
-    cost_percentage = config["expensive_lambda_functions"]["cost_percentage"]
-    name_tag_key = config["expensive_lambda_functions"]["name_tag_key"]
-    past_days = config["expensive_lambda_functions"]["past_days"]
+    cost_percentage = section_config["cost_percentage"]
+    past_days = section_config["past_days"]
 
-    start_date = (datetime.today() - timedelta(days=past_days)).strftime("%Y-%m-%d")
-    end_date = datetime.today().strftime("%Y-%m-%d")
-
-    lambda_worksheet = workbook.add_worksheet("{}% Cost Lambdas".format(cost_percentage))
-    row = 0
+    lambda_sheet = Sheet("{}% Cost Lambdas".format(cost_percentage))
     # add headings
-    lambda_worksheet.write(row, 0, "Function Name", main_heading)
-    lambda_worksheet.write(row, 1, "Cost (in USD) for past {} days".format(past_days), main_heading)
+    lambda_sheet.add_row(["Function Name", "Cost (in USD) for past {} days".format(past_days)], MAIN_HEADING)
     # set length of columns
-    lambda_worksheet.set_column(0, 1, 60)
-    row += 1
-
-    client = boto3.client("ce")
-    response = client.get_cost_and_usage(TimePeriod={'Start': start_date, 'End': end_date}, Granularity='DAILY', Metrics=['UnblendedCost'], GroupBy=[{'Type': 'TAG', 'Key': name_tag_key}], Filter={'Dimensions': {'Key': 'SERVICE', 'Values': ['AWS Lambda']}})
-    raw_data = response.get('ResultsByTime', [])
-    next_token = response.get('NextPageToken')
-    while next_token is not None:
-        response = client.get_cost_and_usage(TimePeriod={'Start': start_date, 'End': end_date}, Granularity='DAILY', Metrics=['UnblendedCost'], GroupBy=[{'Type': 'TAG', 'Key': name_tag_key}], Filter={'Dimensions': {'Key': 'SERVICE', 'Values': ['AWS Lambda']}}, NextPageToken=next_token)
-        raw_data.extend(response['ResultsByTime'])
-        next_token = response.get('NextPageToken')
-
-    clean_data = defaultdict(float)
-    total_cost = 0
-    for interval in raw_data:
-        for group_row in interval['Groups']:
-            function_name = group_row['Keys'][0][len(name_tag_key)+1:]
-            if function_name:
-                interval_fn_cost = float(group_row['Metrics']['UnblendedCost']['Amount'])
-                clean_data[function_name] += interval_fn_cost
-                total_cost += interval_fn_cost
-
-    sorted_functions = sorted(clean_data.items(), key=lambda x: x[1], reverse=True)
+    lambda_sheet.set_column(0, 1, 60)
 
-    target_amount = (cost_percentage / 100.0) * total_cost
-    current_amount = 0
-    for function_name, cost in sorted_functions:
-        lambda_worksheet.write(row, 0, function_name, generic_cell)
-        lambda_worksheet.write(row, 1, cost, generic_cell)
-        row += 1
-        current_amount += cost
-        if current_amount > target_amount:
-            break
+    # costs fetched by the cost_explorer job
+    cost_cube = context["dependencies"]["cost_explorer"][context["cost_request"]]
+    total_cost = cost_cube.total()
+    for function_name, cost in cost_cube.pareto(cost_percentage):
+        lambda_sheet.add_row([function_name, cost])
     if total_cost > 0:
-        lambda_worksheet.write(row, 0, "ALL FUNCTIONS", sub_heading)
-        lambda_worksheet.write(row, 1, total_cost, sub_heading)
-        row += 1
+        lambda_sheet.add_total_row(["ALL FUNCTIONS", total_cost])
+    return lambda_sheet
+
 
-if config["expensive_kinesis_streams"]["enabled"]:
+def collect_expensive_kinesis_streams(section_config, context):
     # Top most expensive kinesis streams
     print("\nLooking for expensive kinesis streams...")
     print("---")
 
-    cost_percentage = config["expensive_kinesis_streams"]["cost_percentage"]
-    name_tag_key = config["expensive_kinesis_streams"]["name_tag_key"]
-    past_days = config["expensive_kinesis_streams"]["past_days"]
+    cost_percentage = section_config["cost_percentage"]
+    past_days = section_config["past_days"]
 
-    start_date = (datetime.today() - timedelta(days=past_days)).strftime("%Y-%m-%d")
-    end_date = datetime.today().strftime("%Y-%m-%d")
-
-    kinesis_worksheet = workbook.add_worksheet("{}% Cost Streams".format(cost_percentage))
-    row = 0
+    kinesis_sheet = Sheet("{}% Cost Streams".format(cost_percentage))
     # add headings
-    kinesis_worksheet.write(row, 0, "Kinesis Stream Name", main_heading)
-    kinesis_worksheet.write(row, 1, "Number of Shards", main_heading)
-    kinesis_worksheet.write(row, 2, "Cost (in USD) for past {} days".format(past_days), main_heading)
+    kinesis_sheet.add_row(["Kinesis Stream Name", "Number of Shards", "Cost (in USD) for past {} days".format(past_days)], MAIN_HEADING)
     # set length of columns
-    kinesis_worksheet.set_column(0, 2, 60)
-    row += 1
-
-    client = boto3.client("ce")
-    response = client.get_cost_and_usage(TimePeriod={'Start': start_date, 'End': end_date}, Granularity='DAILY', Metrics=['UnblendedCost'], GroupBy=[{'Type': 'TAG', 'Key': name_tag_key}], Filter={'Dimensions': {'Key': 'SERVICE', 'Values': ['Amazon Kinesis']}})
-    raw_data = response.get('ResultsByTime', [])
-    next_token = response.get('NextPageToken')
-    while next_token is not None:
-        response = client.get_cost_and_usage(TimePeriod={'Start': start_date, 'End': end_date}, Granularity='DAILY', Metrics=['UnblendedCost'], GroupBy=[{'Type': 'TAG', 'Key': name_tag_key}], Filter={'Dimensions': {'Key': 'SERVICE', 'Values': ['Amazon Kinesis']}}, NextPageToken=next_token)
-        raw_data.extend(response['ResultsByTime'])
-        next_token = response.get('NextPageToken')
-
-    clean_data = defaultdict(float)
-    total_cost = 0
-    for interval in raw_data:
-        for group_row in interval['Groups']:
-            name = group_row['Keys'][0][len(name_tag_key)+1:]
-            if name:
-                interval_stream_cost = float(group_row['Metrics']['UnblendedCost']['Amount'])
-                clean_data[name] += interval_stream_cost
-                total_cost += interval_stream_cost
-
-    sorted_streams = sorted(clean_data.items(), key=lambda x: x[1], reverse=True)
+    kinesis_sheet.set_column(0, 2, 60)
+
+    # costs fetched by the cost_explorer job
+    cost_cube = context["dependencies"]["cost_explorer"][context["cost_request"]]
+    total_cost = cost_cube.total()
 
     target_amount = (cost_percentage / 100.0) * total_cost
     current_amount = 0
-    for name, cost in sorted_streams:
+    for name, cost in cost_cube.descending():
 
         # also fetch number of shards now
         print("Fetching number of shards for", name)
         try:
-            kinesis_client = boto3.client("kinesis")
-            kinesis_response = kinesis_client.describe_stream(StreamName=name, Limit=100)
-            no_of_shards = len(kinesis_response.get('StreamDescription', dict()).get('Shards', []))
-            has_more_shards = kinesis_response.get('StreamDescription', dict()).get('HasMoreShards', False)
+            stream_description = describe_in_regions(context["pools"], lambda catalog: catalog.stream(name), "kinesis")
+            no_of_shards = len(stream_description.get('Shards', []))
+            has_more_shards = stream_description.get('HasMoreShards', False)
             if has_more_shards:
                 no_of_shards = str(no_of_shards) + "+"  # number of shards more than 100!
         except Exception as e:
+            if is_throttling_error(e, "kinesis"):
+                raise
             print(e)
             continue
 
-        kinesis_worksheet.write(row, 0, name, generic_cell)
-        kinesis_worksheet.write(row, 1, no_of_shards, generic_cell)
-        kinesis_worksheet.write(row, 2, cost, generic_cell)
-
-        row += 1
+        kinesis_sheet.add_row([name, no_of_shards, cost])
         current_amount += cost
         if current_amount > target_amount:
             break
     if total_cost > 0:
-        kinesis_worksheet.write(row, 0, "ALL STREAMS", sub_heading)
-        kinesis_worksheet.write(row, 1, "", sub_heading)
-        kinesis_worksheet.write(row, 2, total_cost, sub_heading)
-        row += 1
+        kinesis_sheet.add_total_row(["ALL STREAMS", "", total_cost])
+    return kinesis_sheet
+
 
-if config["expensive_ddb"]["enabled"]:
+def collect_expensive_ddb(section_config, context):
     # Top most expensive dynamodb tables
     print("\nLooking for expensive dynamodb tables...")
     print("---")
 
-    cost_percentage = config["expensive_ddb"]["cost_percentage"]
-    name_tag_key = config["expensive_ddb"]["name_tag_key"]
-    past_days = config["expensive_ddb"]["past_days"]
+    cost_percentage = section_config["cost_percentage"]
+    past_days = section_config["past_days"]
 
-    start_date = (datetime.today() - timedelta(days=past_days)).strftime("%Y-%m-%d")
-    end_date = datetime.today().strftime("%Y-%m-%d")
-
-    worksheet = workbook.add_worksheet("{}% Cost DynamoDB Tables".format(cost_percentage))
-    row = 0
+    ddb_sheet = Sheet("{}% Cost DynamoDB Tables".format(cost_percentage))
     # add headings
-    worksheet.write(row, 0, "DynamoDB Table Name", main_heading)
-    worksheet.write(row, 1, "Billing Mode", main_heading)
-    worksheet.write(row, 2, "Number of Items", main_heading)
-    worksheet.write(row, 3, "Storage in GB", main_heading)
-    worksheet.write(row, 4, "Cost (in USD) for past {} days".format(past_days), main_heading)
+    ddb_sheet.add_row(["DynamoDB Table Name", "Billing Mode", "Number of Items", "Storage in GB",
+                       "Cost (in USD) for past {} days".format(past_days)], MAIN_HEADING)
     # set length of columns
-    worksheet.set_column(0, 5, 60)
-    row += 1
-
-    client = boto3.client("ce")
-    response = client.get_cost_and_usage(TimePeriod={'Start': start_date, 'End': end_date}, Granularity='DAILY', Metrics=['UnblendedCost'], GroupBy=[{'Type': 'TAG', 'Key': name_tag_key}], Filter={'Dimensions': {'Key': 'SERVICE', 'Values': ['Amazon DynamoDB']}})
-    raw_data = response.get('ResultsByTime', [])
-    next_token = response.get('NextPageToken')
-    while next_token is not None:
-        response = client.get_cost_and_usage(TimePeriod={'Start': start_date, 'End': end_date}, Granularity='DAILY', Metrics=['UnblendedCost'], GroupBy=[{'Type': 'TAG', 'Key': name_tag_key}], Filter={'Dimensions': {'Key': 'SERVICE', 'Values': ['Amazon DynamoDB']}}, NextPageToken=next_token)
-        raw_data.extend(response['ResultsByTime'])
-        next_token = response.get('NextPageToken')
-    clean_data = defaultdict(float)
-    total_cost = 0
-    for interval in raw_data:
-        for group_row in interval['Groups']:
-            name = group_row['Keys'][0][len(name_tag_key)+1:]
-            if name:
-                interval_cost = float(group_row['Metrics']['UnblendedCost']['Amount'])
-                clean_data[name] += interval_cost
-                total_cost += interval_cost
-
-    sorted_tables = sorted(clean_data.items(), key=lambda x: x[1], reverse=True)
+    ddb_sheet.set_column(0, 5, 60)
+
+    # costs fetched by the cost_explorer job
+    cost_cube = context["dependencies"]["cost_explorer"][context["cost_request"]]
+    total_cost = cost_cube.total()
 
     target_amount = (cost_percentage / 100.0) * total_cost
     current_amount = 0
-    for name, cost in sorted_tables:
+    for name, cost in cost_cube.descending():
         # fetch details for tables
         print("Fetching details for ", name)
         try:
-            dynamodb = boto3.client("dynamodb")
-            ddb_table = dynamodb.describe_table(TableName=name)['Table']
+            ddb_table = describe_in_regions(context["pools"], lambda catalog: catalog.table(name), "dynamodb")
             number_of_items = ddb_table.get('ItemCount', 0)
             storage_in_gb = ddb_table.get('TableSizeBytes', 0) / 1024.0 / 1024.0 / 1024.0
             billing_mode = ddb_table.get('BillingModeSummary', dict()).get('BillingMode', "Not Available")
         except Exception as e:
+            if is_throttling_error(e, "dynamodb"):
+                raise
             print(e)
             continue
 
-        worksheet.write(row, 0, name, generic_cell)
-        worksheet.write(row, 1, billing_mode, generic_cell)
-        worksheet.write(row, 2, number_of_items, generic_cell)
-        worksheet.write(row, 3, storage_in_gb, generic_cell)
-        worksheet.write(row, 4, cost, generic_cell)
-
-        row += 1
+        ddb_sheet.add_row([name, billing_mode, number_of_items, storage_in_gb, cost])
         current_amount += cost
         if current_amount > target_amount:
             break
     if total_cost > 0:
-        worksheet.write(row, 0, "ALL TABLES", sub_heading)
-        worksheet.write(row, 1, "", sub_heading)
-        worksheet.write(row, 2, "", sub_heading)
-        worksheet.write(row, 3, "", sub_heading)
-        worksheet.write(row, 4, total_cost, sub_heading)
-        row += 1
-
-if config["on_demand_ddb"]["enabled"]:
+        ddb_sheet.add_total_row(["ALL TABLES", "", "", "", total_cost])
+    return ddb_sheet
+
+
+def collect_on_demand_ddb(section_config, context):
     # On Demand DynamoDB Tables
     print("\nLooking for on demand dynamodb tables...")
     print("---")
 
-    ddb_worksheet = workbook.add_worksheet("On-Demand DynamoDB Tables")
-    row = 0
+    on_demand_sheet = Sheet("On-Demand DynamoDB Tables")
     # add headings
-    ddb_worksheet.write(row, 0, "DynamoDB Table Name", main_heading)
-    row += 1
-    ddb_worksheet.set_column(0, 0, 40)
+    on_demand_sheet.add_row(["DynamoDB Table Name"], MAIN_HEADING)
+    on_demand_sheet.set_column(0, 0, 40)
 
-    client = boto3.client("dynamodb")
-    for table in get_dynamodb_tables(client):
+    catalog = context["pool"].catalog
+    for table in catalog.tables():
         print("Checking for table", table)
-        billing_mode = client.describe_table(TableName=table)['Table'].get('BillingModeSummary', dict()).get('BillingMode', "")
+        billing_mode = catalog.table(table).get('BillingModeSummary', dict()).get('BillingMode', "")
         if billing_mode == "PAY_PER_REQUEST":
             # table is on-demand
-            ddb_worksheet.write(row, 0, table)
-            row += 1
+            on_demand_sheet.add_row([table], None)
+    return on_demand_sheet
+
 
-# reusable values
-log_group_gb = defaultdict(float)
-past_days = 14
-if config["storage_cloudwatch_log_groups"]["enabled"]:
+def collect_storage_cloudwatch_log_groups(section_config, context):
     # Top N CloudWatch Log Groups by incoming bytes
     print("\nLooking for incoming bytes cloudwatch log groups...")
     print("---")
 
-    top_n = config["storage_cloudwatch_log_groups"]["top_n"]
-    past_days = config["storage_cloudwatch_log_groups"]["past_days"]
+    top_n = section_config["top_n"]
+    past_days = section_config["past_days"]
+    log_group_gb = defaultdict(float)
 
-    cloudwatch_worksheet = workbook.add_worksheet("Top {} Log Groups".format(top_n))
-    row = 0
+    cloudwatch_sheet = Sheet("Top {} Log Groups".format(top_n))
     # add headings
-    cloudwatch_worksheet.write(row, 0, "CloudWatch Log Group", main_heading)
-    cloudwatch_worksheet.write(row, 1, "Incoming GBs in last {} days".format(past_days), main_heading)
+    cloudwatch_sheet.add_row(["CloudWatch Log Group", "Incoming GBs in last {} days".format(past_days)], MAIN_HEADING)
     # set length of columns
-    cloudwatch_worksheet.set_column(0, 1, 60)
-    row += 1
+    cloudwatch_sheet.set_column(0, 1, 60)
 
-    client = boto3.client("cloudwatch")
+    client = context["pool"].client("cloudwatch")
 
-    start_time = int(datetime.timestamp(datetime.now() - timedelta(days=past_days)))
     end_time = int(datetime.timestamp(datetime.now()))
-    period = end_time - start_time
-
-    # fetch log groups active in last 14 days
-    response = client.list_metrics(Namespace='AWS/Logs', MetricName="IncomingBytes")
-    metrics = response.get('Metrics', [])
-    next_token = response.get('NextToken')
-    while next_token is not None:
-        response = client.list_metrics(Namespace='AWS/Logs', MetricName="IncomingBytes")
-        metrics.extend(response['Metrics'])
-        next_token = response.get('NextToken')
-
-    # form data queries in required format
-    metric_data_queries = list()
-    for metric in metrics:
-        unique_id = generate_unique_string()
-        metric_data_queries.append({
-            "Id": unique_id,
-            "MetricStat": {
-                "Metric": metric,
-                "Period": period,
-                "Stat": "Sum",
-                "Unit": "Bytes"
-            }
-        })
-
-    # now fetch incoming bytes for them in batches
+    start_time = end_time - int(timedelta(days=past_days).total_seconds())
+
+    # a single Metrics Insights query gets the top N, unless other sections need every log group
+    incoming_bytes = None
+    mode = section_config.get("mode", INSIGHTS_MODE)
+    if mode not in [INSIGHTS_MODE, ENUMERATE_MODE]:
+        raise Exception("ERROR: Unknown mode {} of storage_cloudwatch_log_groups :(".format(mode))
+    if mode == INSIGHTS_MODE and context["dependents"]:
+        print("Fetching every log group, as needed by", ", ".join(context["dependents"]))
+    elif mode == INSIGHTS_MODE and (top_n > INSIGHTS_MAX_LIMIT or past_days > INSIGHTS_MAX_DAYS):
+        print("Fetching every log group, Metrics Insights is limited to top {} over {} days".format(INSIGHTS_MAX_LIMIT, INSIGHTS_MAX_DAYS))
+    elif mode == INSIGHTS_MODE:
+        try:
+            incoming_bytes = get_top_log_group_sums(client, top_n, start_time, end_time)
+        except ClientError as e:
+            if is_throttling_error(e):
+                raise
+            print("Fetching every log group, Metrics Insights query failed:", e)
+
+    if incoming_bytes is None:
+        # fetch log groups active in the past days, and their incoming bytes
+        metrics = get_log_group_metrics(client)
+        print("Fetching incoming bytes of", len(metrics), "log groups...")
+        incoming_bytes = get_log_group_sums(client, metrics, start_time, end_time,
+                                            section_config.get("concurrency", DEFAULT_METRIC_DATA_CONCURRENCY))
     results = []
-    BATCH_SIZE = 100
-    for index in range(0, len(metric_data_queries), BATCH_SIZE):
-        response = client.get_metric_data(MetricDataQueries=metric_data_queries[index:index+BATCH_SIZE], StartTime=start_time, EndTime=end_time)
-        batch_results = response.get('MetricDataResults', [])
-        next_token = response.get('NextToken')
-        while next_token is not None:
-            response = client.get_metric_data(MetricDataQueries=metric_data_queries[index:index+BATCH_SIZE], StartTime=start_time, EndTime=end_time, NextToken=next_token)
-            batch_results.extend(response['MetricDataResults'])
-            next_token = response.get('NextToken')
-        for result in batch_results:
-            if result['StatusCode'] == "Complete" and result['Label'] != "IncomingBytes":
-                try:
-                    incoming_gb = result['Values'][0] / (1024 * 1024 * 1024)  # convert bytes to GB
-                    results.append((result['Label'], incoming_gb))
-                    log_group_gb[result['Label']] = incoming_gb
-                except IndexError:
-                    continue
+    for name, value in incoming_bytes.items():
+        incoming_gb = value / BYTES_IN_GB
+        results.append((name, incoming_gb))
+        log_group_gb[name] = incoming_gb
 
     results.sort(key=lambda x: x[1], reverse=True)
     results = results[:top_n]
 
     for name, incoming_gb in results:
-        cloudwatch_worksheet.write(row, 0, name, generic_cell)
-        cloudwatch_worksheet.write(row, 1, incoming_gb, generic_cell)
-        row += 1
+        cloudwatch_sheet.add_row([name, incoming_gb])
 
-if config['api_gateway_cloudwatch']["enabled"]:
-    # Top N API Gateway REST API stages CloudWatch Log Groups
+    # reusable values for the API Gateway sheet
+    cloudwatch_sheet.outputs["log_group_gb"] = log_group_gb
+    cloudwatch_sheet.outputs["past_days"] = past_days
+    return cloudwatch_sheet
 
-    if not config["storage_cloudwatch_log_groups"]["enabled"]:
-        raise Exception("ERROR: Cannot add API Gateway sheet since storage_cloudwatch_log_groups was not enabled :(")
 
+def collect_api_gateway_cloudwatch(section_config, context):
+    # Top N API Gateway REST API stages CloudWatch Log Groups
     print("\nLooking for API Gateway REST API stages CloudWatch Log Groups...")
     print("---")
-    top_n = config["api_gateway_cloudwatch"]["top_n"]
+    top_n = section_config["top_n"]
+    log_groups_outputs = context["dependencies"]["storage_cloudwatch_log_groups"].outputs
+    log_group_gb = log_groups_outputs["log_group_gb"]
+    past_days = log_groups_outputs["past_days"]
 
-    api_gateway_worksheet = workbook.add_worksheet("Top {} API GW Logs".format(top_n))
-    row = 0
+    api_gateway_sheet = Sheet("Top {} API GW Logs".format(top_n))
     # add headings
-    api_gateway_worksheet.write(row, 0, "REST API", main_heading)
-    api_gateway_worksheet.write(row, 1, "Stage", main_heading)
-    api_gateway_worksheet.write(row, 2, "Execution Log Group", main_heading)
-    api_gateway_worksheet.write(row, 3, "Incoming GBs in last {} days".format(past_days), main_heading)
-    api_gateway_worksheet.write(row, 4, "Access Log Group", main_heading)
-    api_gateway_worksheet.write(row, 5, "Incoming GBs in last {} days".format(past_days), main_heading)
+    api_gateway_sheet.add_row(["REST API", "Stage", "Execution Log Group", "Incoming GBs in last {} days".format(past_days),
+                               "Access Log Group", "Incoming GBs in last {} days".format(past_days)], MAIN_HEADING)
     # set length of columns
-    api_gateway_worksheet.set_column(0, 5, 30)
-    row += 1
+    api_gateway_sheet.set_column(0, 5, 30)
 
-    client = boto3.client("apigateway")
+    client = context["pool"].client("apigateway")
 
     # get all apis first
     print("Fetching all REST APIs....")
@@ -719,54 +573,468 @@ if config['api_gateway_cloudwatch']["enabled"]:
     results.sort(key=lambda x: x[3]+x[5], reverse=True)
     results = results[:top_n]
     for result_row in results:
-        for i in range(0, 6):
-            api_gateway_worksheet.write(row, i, result_row[i], generic_cell)
-        row += 1
+        api_gateway_sheet.add_row(result_row)
+    return api_gateway_sheet
 
 
-if config["unused_elastic_ips"]["enabled"]:
+def collect_unused_elastic_ips(section_config, context):
     # Unused Elastic IPs
     print("\nLooking for unused elastic IPs...")
     print("---")
 
-    elastic_ips_worksheet = workbook.add_worksheet("Unused Elastic IPs")
-    row = 0
+    elastic_ips_sheet = Sheet("Unused Elastic IPs")
     # add headings
-    elastic_ips_worksheet.write(row, 0, "Elastic Public IP", main_heading)
-    elastic_ips_worksheet.write(row, 1, "Assigned to Instance", main_heading)
-    elastic_ips_worksheet.write(row, 2, "Instance State", main_heading)
-    elastic_ips_worksheet.write(row, 3, "Instance Name", main_heading)
-    elastic_ips_worksheet.write(row, 4, "Instance ID", main_heading)
+    elastic_ips_sheet.add_row(["Elastic Public IP", "Assigned to Instance", "Instance State", "Instance Name", "Instance ID"], MAIN_HEADING)
     # set length of columns
-    elastic_ips_worksheet.set_column(0, 4, 30)
-    row += 1
+    elastic_ips_sheet.set_column(0, 4, 30)
 
-    client = boto3.client("ec2")
+    client = context["pool"].client("ec2")
     addresses = client.describe_addresses()['Addresses']
     for address in addresses:
         instance_id = address.get('InstanceId', "")
         instance_name = ""
         instance_status = ""
         if instance_id:
-            try:
-                response = client.describe_instances(InstanceIds=[instance_id])
-                instance_details = response['Reservations'][0]['Instances'][0]
-            except Exception as e:
-                print(e)
+            instance_details = context["pool"].catalog.instance(instance_id)
+            if instance_details is None:
+                print("Instance", instance_id, "not found")
                 continue
             for tag in instance_details['Tags']:
                 if tag["Key"] == "Name":
                     instance_name = tag["Value"]
             instance_state = instance_details['State']['Name']
         if not instance_id or instance_state != "running":
-            elastic_ips_worksheet.write(row, 0, address["PublicIp"], generic_cell)
             if not instance_id:
-                elastic_ips_worksheet.write(row, 1, "NO", red_text_cell)
+                elastic_ips_sheet.add_row([address["PublicIp"], "NO"], [GENERIC_CELL, RED_TEXT_CELL])
             else:
-                elastic_ips_worksheet.write(row, 1, "YES", green_text_cell)
-                elastic_ips_worksheet.write(row, 2, instance_state, generic_cell)
-                elastic_ips_worksheet.write(row, 3, instance_name, generic_cell)
-                elastic_ips_worksheet.write(row, 4, instance_id, generic_cell)
-            row += 1
-
-workbook.close()
+                elastic_ips_sheet.add_row([address["PublicIp"], "YES", instance_state, instance_name, instance_id],
+                                          [GENERIC_CELL, GREEN_TEXT_CELL, GENERIC_CELL, GENERIC_CELL, GENERIC_CELL])
+    return elastic_ips_sheet
+
+
+# collector function against config.json key of every section
+SECTION_COLLECTORS = {
+    "expensive_services": collect_expensive_services,
+    "untagged_resources": collect_untagged_resources,
+    "unreferenced_snapshots": collect_unreferenced_snapshots,
+    "unattached_volumes": collect_unattached_volumes,
+    "expensive_lambda_functions": collect_expensive_lambda_functions,
+    "expensive_kinesis_streams": collect_expensive_kinesis_streams,
+    "expensive_ddb": collect_expensive_ddb,
+    "on_demand_ddb": collect_on_demand_ddb,
+    "storage_cloudwatch_log_groups": collect_storage_cloudwatch_log_groups,
+    "api_gateway_cloudwatch": collect_api_gateway_cloudwatch,
+    "unused_elastic_ips": collect_unused_elastic_ips,
+}
+
+# service of the costs every Cost Explorer section looks at, None for all services
+COST_SECTION_SERVICES = {
+    "expensive_services": None,
+    "expensive_lambda_functions": "AWS Lambda",
+    "expensive_kinesis_streams": "Amazon Kinesis",
+    "expensive_ddb": "Amazon DynamoDB",
+}
+
+# Cost Explorer granularity of the sections not answered by MONTHLY periods, expensive services leave out
+# the negative costs of every service per day
+COST_SECTION_GRANULARITIES = {
+    "expensive_services": "DAILY",
+}
+
+# jobs whose outputs are consumed by a section
+SECTION_DEPENDENCIES = {
+    "expensive_services": ["cost_explorer"],
+    "expensive_lambda_functions": ["cost_explorer"],
+    "expensive_kinesis_streams": ["cost_explorer"],
+    "expensive_ddb": ["cost_explorer"],
+    "api_gateway_cloudwatch": ["storage_cloudwatch_log_groups"],
+}
+
+# sections looking at the whole account, collected once whatever the regions
+GLOBAL_SECTIONS = list(COST_SECTION_SERVICES)
+# sections with regional as well as global resources, collected per region plus once for the global ones
+MIXED_SECTIONS = ["untagged_resources"]
+
+
+def get_cost_request(name, section_config):
+    """
+    Returns the Cost Explorer request of the given section
+    """
+    start_date, end_date = get_cost_window(section_config["past_days"])
+    return cost_request(start_date, end_date, COST_SECTION_SERVICES[name], section_config.get("name_tag_key"),
+                        COST_SECTION_GRANULARITIES.get(name, GRANULARITIES[0]))
+
+
+def get_job_name(name, region):
+    """
+    Returns name of the job collecting the given section in region, None for the default region
+    """
+    return name if region is None else "{}@{}".format(name, region)
+
+
+def get_section_name(job_name):
+    """
+    Returns name of the section (or global job) collected by the given job
+    """
+    return job_name.split("@")[0]
+
+
+def section_job(name, section_config, cost_requests, pool, pools, include_regional=True, include_global=True, dependents=()):
+    """
+    Returns a job collecting the sheet of the given section, for run_jobs
+
+    pool -- ClientPool of the region the job collects
+    pools -- ClientPool of every region of the run
+    dependents -- sections of the run consuming the outputs of this one
+    """
+    def job(dependencies):
+        # sections look up their dependencies by section name, whatever the region
+        dependencies = {get_section_name(job_name): result for job_name, result in dependencies.items()}
+        context = {"dependencies": dependencies, "cost_request": cost_requests.get(name), "pool": pool, "pools": pools,
+                   "include_regional": include_regional, "include_global": include_global, "dependents": list(dependents)}
+        return SECTION_COLLECTORS[name](section_config, context)
+    return job
+
+
+def measured_job(job_name, job):
+    """
+    Returns the job recording its calls, wall time and rows (if it collects a sheet) under job_name
+    """
+    def measured(dependencies):
+        with recorder.section(job_name):
+            result = job(dependencies)
+        if isinstance(result, Sheet):
+            recorder.add_rows(job_name, max(0, result.count_rows() - 1))
+        return result
+    return measured
+
+
+def plan_section_jobs(sections, config, cost_requests, global_pool, pools):
+    """
+    Returns (jobs, dependencies, parts) for run_jobs, with a job per region for regional sections,
+    and parts as list of (job name, region label) against section, the sheets to merge into the section's sheet.
+    Running just the default region (single pool of region None) gives one job per section, without a label.
+    """
+    jobs = dict()
+    dependencies = dict()
+    parts = dict()
+    multi_region = pools[0].region is not None
+    for name in sections:
+        dependents = [other for other in sections if name in SECTION_DEPENDENCIES.get(other, [])]
+        if name in GLOBAL_SECTIONS:
+            jobs[name] = section_job(name, config[name], cost_requests, global_pool, pools, dependents=dependents)
+            dependencies[name] = SECTION_DEPENDENCIES.get(name, [])
+            parts[name] = [(name, None)]
+            continue
+        parts[name] = []
+        for pool in pools:
+            job_name = get_job_name(name, pool.region)
+            jobs[job_name] = section_job(name, config[name], cost_requests, pool, pools,
+                                         include_global=name not in MIXED_SECTIONS or not multi_region, dependents=dependents)
+            # regional dependencies are the jobs of the same region
+            dependencies[job_name] = [dependency if dependency in GLOBAL_SECTIONS or dependency not in SECTION_COLLECTORS
+                                      else get_job_name(dependency, pool.region) for dependency in SECTION_DEPENDENCIES.get(name, [])]
+            parts[name].append((job_name, pool.region))
+        if name in MIXED_SECTIONS and multi_region:
+            job_name = get_job_name(name, GLOBAL_LABEL)
+            jobs[job_name] = section_job(name, config[name], cost_requests, global_pool, pools, include_regional=False)
+            parts[name].append((job_name, GLOBAL_LABEL))
+    return jobs, dependencies, parts
+
+
+def cost_explorer_job(cost_requests, cache_config, pool, account_id=None):
+    """
+    Returns a job fetching the Cost Explorer data of all the sections at once, for run_jobs.
+    Its result is a CostCube against every request.
+    """
+    def job(dependencies):
+        print("\nFetching Cost Explorer data...")
+        print("---")
+        client = pool.client("ce")
+        cache = None
+        if cache_config.get("enabled", False):
+            cache = CostCache(cache_config.get("path", DEFAULT_CACHE_PATH), cache_config.get("ttl_days", DEFAULT_TTL_DAYS),
+                              cache_config.get("max_entries", DEFAULT_MAX_ENTRIES), account_id + ":" if account_id else "")
+        try:
+            cost_data = fetch_cost_data(client, cost_requests.values(), cache)
+        finally:
+            if cache is not None:
+                cache.close()
+        # request[3] is the tag key the request groups by
+        return {request: CostCube(results, request[3]) for request, results in cost_data.items()}
+    return job
+
+
+def open_inventory_store(settings):
+    """
+    Returns the InventoryStore of the inventory_store setting, None if it is disabled
+    """
+    inventory_config = settings.get("inventory_store", dict())
+    if not inventory_config.get("enabled", False):
+        return None
+    return InventoryStore(inventory_config.get("path", DEFAULT_INVENTORY_PATH),
+                          inventory_config.get("ttl_days", DEFAULT_INVENTORY_TTL_DAYS),
+                          inventory_config.get("force_refresh", False))
+
+
+def get_max_pool_connections(config, sections):
+    """
+    Returns the number of concurrent calls a shared client may have to serve: the largest concurrency setting
+    of the sections, plus a call for every other section running at the same time
+    """
+    settings = config.get("settings", dict())
+    if "max_pool_connections" in settings:
+        return settings["max_pool_connections"]
+    largest = DEFAULT_CONCURRENCY
+    for name in sections:
+        concurrency = config[name].get("concurrency", dict())
+        largest = max([largest] + list(concurrency.values() if isinstance(concurrency, dict) else [concurrency]))
+    return largest + settings.get("max_parallel_sections", DEFAULT_MAX_WORKERS)
+
+
+def get_pools(settings, credentials=None, inventory=None):
+    """
+    Returns (ClientPool of the default region, ClientPool of every region of the regions setting)
+    """
+    # clients of the default region make the global calls
+    global_pool = ClientPool(credentials=credentials, inventory=inventory)
+    regions = get_regions(settings.get("regions"), global_pool)
+    pools = [global_pool] if regions == [None] else [ClientPool(region, credentials, inventory) for region in regions]
+    if regions != [None]:
+        print("Collecting regional sections in", ", ".join(regions))
+    return global_pool, pools
+
+
+def collect_sheets(config, sections, credentials=None, account_id=None, warm_pools=None):
+    """
+    Returns sheet against section name, for the given sections of config
+
+    credentials -- keyword arguments of boto3.Session (of an assumed role), None for the default credentials
+    account_id -- account of the credentials, None for the default credentials
+    warm_pools -- (global pool, pools) of get_pools to reuse, along with their inventory store, None for new ones
+    """
+    settings = config.get("settings", dict())
+    configure_rate_limits(settings.get("rate_limits", dict()))
+    configure_pool_connections(get_max_pool_connections(config, sections))
+
+    inventory = None
+    if warm_pools is None:
+        inventory = open_inventory_store(settings)
+        global_pool, pools = get_pools(settings, credentials, inventory)
+    else:
+        global_pool, pools = warm_pools
+
+    cost_requests = {name: get_cost_request(name, config[name]) for name in sections if name in COST_SECTION_SERVICES}
+    jobs, dependencies, parts = plan_section_jobs(sections, config, cost_requests, global_pool, pools)
+    if cost_requests:
+        jobs["cost_explorer"] = cost_explorer_job(cost_requests, settings.get("cost_explorer_cache", dict()), global_pool, account_id)
+    jobs = {job_name: measured_job(job_name, job) for job_name, job in jobs.items()}
+    try:
+        job_sheets = run_jobs(jobs, dependencies, settings.get("max_parallel_sections", DEFAULT_MAX_WORKERS))
+    finally:
+        if inventory is not None:
+            inventory.close()
+
+    sheets = dict()
+    for name in sections:
+        job_names = [job_name for job_name, label in parts[name]]
+        labels = [label for job_name, label in parts[name]]
+        if labels[0] is None:
+            sheets[name] = job_sheets[job_names[0]]
+        else:
+            sheets[name] = merge_sheets([job_sheets[job_name] for job_name in job_names], labels, "Region")
+        # outputs are only consumed by other sections of the same run
+        sheets[name].outputs = dict()
+    return sheets
+
+
+def collect_account_sheets(config, sections, account_id, role_name):
+    """
+    Returns (sheet against section name, run stats) for the given account, assuming role_name in it.
+    Runs in a worker process of collect_organization_sheets.
+    """
+    print("\nCollecting account", account_id)
+    # workers collect several accounts one after another, stats are sent back per account
+    recorder.reset()
+    # and the daemon's workers collect them again on every refresh, resources are fetched again each time
+    clear_cache()
+    credentials = assume_account_role(account_id, role_name)
+    sheets = collect_sheets(config, sections, credentials, account_id)
+    return sheets, recorder.to_dict()
+
+
+def collect_organization_sheets(config, sections, organization, executor=None):
+    """
+    Returns sheet against section name with the rows of all the accounts of the organization setting,
+    collected in a pool of worker processes, one account per worker, and merged with an Account column
+
+    executor -- ProcessPoolExecutor to collect the accounts in, None for a new one of max_processes workers
+    """
+    # imported only when an organization is collected, as the daemon below
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=organization.get("max_processes", DEFAULT_MAX_PROCESSES)) as executor:
+            return collect_organization_sheets(config, sections, organization, executor)
+
+    account_ids = [str(account_id) for account_id in organization["account_ids"]]
+    role_name = organization["role_name"]
+    account_sheets = []
+    futures = [executor.submit(collect_account_sheets, config, sections, account_id, role_name) for account_id in account_ids]
+    for account_id, future in zip(account_ids, futures):
+        try:
+            sheets, stats_dict = future.result()
+            recorder.merge(stats_dict)
+            account_sheets.append((account_id, sheets))
+        except BrokenProcessPool:
+            # none of the other accounts can be collected in it either
+            raise
+        except Exception as e:
+            print(e)
+            print("Skipping account", account_id, "since it could not be collected")
+    if not account_sheets:
+        raise Exception("ERROR: None of the accounts could be collected :(")
+
+    sheets = dict()
+    for name in sections:
+        sheets[name] = merge_sheets([collected[name] for account_id, collected in account_sheets],
+                                    [account_id for account_id, collected in account_sheets], "Account")
+    return sheets
+
+
+def run_daemon(config, sections):
+    """
+    Keeps the sections up to date on the schedules of the daemon setting, and serves them over HTTP.
+    Clients are created once and reused by every refresh, resources are fetched again by each of them.
+    Accounts of an organization are collected in worker processes started once, keeping their clients too.
+    """
+    from daemon_helpers import ReportDaemon
+    settings = config.get("settings", dict())
+    organization = settings.get("organization", dict())
+    inventory = None
+    executors = []
+    if organization.get("account_ids"):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+
+        def start_workers():
+            # the daemon runs threads by then, which a forked worker could inherit in the middle of a lock
+            executors[:] = [ProcessPoolExecutor(max_workers=organization.get("max_processes", DEFAULT_MAX_PROCESSES),
+                                                mp_context=multiprocessing.get_context("spawn"))]
+
+        def collect(names):
+            try:
+                return collect_organization_sheets(config, names, organization, executors[0])
+            except BrokenProcessPool:
+                print("A worker process died, starting new ones for the next refresh")
+                executors[0].shutdown(wait=False)
+                start_workers()
+                raise
+
+        start_workers()
+    else:
+        inventory = open_inventory_store(settings)
+        warm_pools = get_pools(settings, inventory=inventory)
+
+        def collect(names):
+            for pool in warm_pools[1] + [warm_pools[0]]:
+                pool.refresh()
+            clear_cache()
+            try:
+                return collect_sheets(config, names, warm_pools=warm_pools)
+            finally:
+                # fetched tags are written every refresh, not only when the daemon stops
+                if inventory is not None:
+                    inventory.flush()
+
+    dependencies = {name: [dependency for dependency in SECTION_DEPENDENCIES.get(name, []) if dependency in SECTION_COLLECTORS]
+                    for name in sections}
+    daemon = ReportDaemon(sections, collect, dependencies, settings.get("daemon", dict()), recorder.to_dict)
+    try:
+        daemon.serve_forever()
+    finally:
+        if inventory is not None:
+            inventory.close()
+        for executor in executors:
+            executor.shutdown()
+
+
+def load_config(path=DEFAULT_CONFIG_PATH):
+    print("Loading {} file....".format(path))
+    with open(path) as json_file:
+        config = json.load(json_file)
+    print("configuration loaded!")
+    return config
+
+
+def get_sections(config, names=None):
+    """
+    Returns the given section names (all the enabled sections by default), in the order of config.json
+    """
+    if names is None:
+        sections = [name for name in config if name in SECTION_COLLECTORS and config[name]["enabled"]]
+    else:
+        unknown = [name for name in names if name not in SECTION_COLLECTORS or name not in config]
+        if unknown:
+            raise Exception("ERROR: Unknown sections {} :(".format(", ".join(unknown)))
+        sections = [name for name in config if name in names]
+    if "api_gateway_cloudwatch" in sections and "storage_cloudwatch_log_groups" not in sections:
+        raise Exception("ERROR: Cannot add API Gateway sheet since storage_cloudwatch_log_groups was not enabled :(")
+    return sections
+
+
+def collect_report_sheets(config, sections):
+    """
+    Returns sheet against section name for the given sections, of all the accounts of the organization setting if any
+    """
+    organization = config.get("settings", dict()).get("organization", dict())
+    if organization.get("account_ids"):
+        return collect_organization_sheets(config, sections, organization)
+    return collect_sheets(config, sections)
+
+
+def collect_rows(config, names=None):
+    """
+    Returns the rows of the given sections (all the enabled sections by default) against section name,
+    every row as a dict of the section headings (without the total row), without writing any output
+
+    e.g. collect_rows(load_config(), ["unattached_volumes"])["unattached_volumes"]
+    """
+    sections = get_sections(config, names)
+    sheets = collect_report_sheets(config, sections)
+    records = RecordListSink()
+    write_sheets([records], [(name, sheets[name]) for name in sections])
+    return records.records
+
+
+def main():
+    started = time.monotonic()
+    parser = argparse.ArgumentParser(description="Generates the cost report of config.json")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep the report up to date on the schedules of the daemon setting, and serve it over HTTP")
+    args = parser.parse_args()
+
+    config = load_config()
+    settings = config.get("settings", dict())
+    # sections in the order of config.json
+    sections = get_sections(config)
+    startup_seconds = time.monotonic() - IMPORT_STARTED
+    print("Started in {:.2f}s".format(startup_seconds))
+    if args.daemon:
+        return run_daemon(config, sections)
+
+    sheets = collect_report_sheets(config, sections)
+    sheets = [(name, sheets[name]) for name in sections]
+    wall_time_seconds = time.monotonic() - started
+    run_stats_config = settings.get("run_stats", dict())
+    if run_stats_config.get("enabled", False):
+        stats_dict = recorder.to_dict()
+        write_stats_file(run_stats_config.get("path", DEFAULT_STATS_PATH), stats_dict, wall_time_seconds, startup_seconds)
+        if run_stats_config.get("sheet", False):
+            sheets.append(("run_stats", get_stats_sheet(stats_dict, wall_time_seconds)))
+    write_sheets(get_sinks(settings.get("outputs")), sheets)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Helper functions to aggregate Cost Explorer results in a compact cube of period × key × metric
+
+Every cost of a request is loaded once, into an array of doubles per period and metric with a cell per key
+(service, or value of the tag grouped by), so that sections sum and rank the costs without rebuilding
+dicts of the results, and the ranking picks just the keys needed to reach the cost percentage.
+"""
+
+import heapq
+import operator
+from array import array
+from cost_explorer_helpers import METRIC
+
+
+def zeros(size):
+    return array('d', bytes(8 * size))
+
+
+class CostCube:
+    """
+    Costs of the ResultsByTime of a request
+
+    tag_key -- tag the results are grouped by, its "<tag_key>$" prefix is stripped from the keys and
+               untagged costs (empty values) are left out. None for results grouped by service.
+    """
+
+    def __init__(self, results, tag_key=None, metrics=(METRIC,)):
+        self.metrics = list(metrics)
+        self.periods = []
+        self.keys = []
+        self.indexes = dict()
+        # totals in the order of the results, so they match summing the results by hand
+        self.totals = {metric: 0.0 for metric in self.metrics}
+        self.positive_totals = {metric: 0.0 for metric in self.metrics}
+        cells = []
+        for interval in results:
+            self.periods.append(interval['TimePeriod']['Start'])
+            period_cells = []
+            for group_row in interval.get('Groups', []):
+                key = group_row['Keys'][0]
+                if tag_key is not None:
+                    key = key[len(tag_key) + 1:]
+                    if not key:
+                        continue
+                if key not in self.indexes:
+                    self.indexes[key] = len(self.keys)
+                    self.keys.append(key)
+                amounts = [float(group_row['Metrics'][metric]['Amount']) for metric in self.metrics]
+                for metric, amount in zip(self.metrics, amounts):
+                    self.totals[metric] += amount
+                    if amount > 0:
+                        self.positive_totals[metric] += amount
+                period_cells.append((self.indexes[key], amounts))
+            cells.append(period_cells)
+
+        self.rows = {metric: [] for metric in self.metrics}
+        for period_cells in cells:
+            period_rows = [zeros(len(self.keys)) for metric in self.metrics]
+            for index, amounts in period_cells:
+                for row, amount in zip(period_rows, amounts):
+                    row[index] += amount
+            for metric, row in zip(self.metrics, period_rows):
+                self.rows[metric].append(row)
+
+    def total(self, metric=METRIC, positive_only=False):
+        """
+        Returns the cost of all the keys, only adding the positive costs if positive_only
+        """
+        return self.positive_totals[metric] if positive_only else self.totals[metric]
+
+    def key_totals(self, metric=METRIC, positive_only=False):
+        """
+        Returns array of the cost of every key over all the periods, only adding the positive costs if positive_only
+        """
+        totals = zeros(len(self.keys))
+        for row in self.rows[metric]:
+            if positive_only:
+                row = map(max, row, zeros(len(row)))
+            totals = array('d', map(operator.add, totals, row))
+        return totals
+
+    def descending(self, metric=METRIC, positive_only=False):
+        """
+        Yields (key, cost) of every key from the most expensive one, keys of equal cost in the order of the results.
+        With positive_only, only the positive costs are added and keys without any are left out.
+        Keys are popped from a heap, so taking the first few doesn't sort all of them.
+        """
+        heap = [(-cost, index) for index, cost in enumerate(self.key_totals(metric, positive_only))
+                if cost > 0 or not positive_only]
+        heapq.heapify(heap)
+        while heap:
+            cost, index = heapq.heappop(heap)
+            yield self.keys[index], -cost
+
+    def pareto(self, percentage, metric=METRIC, positive_only=False):
+        """
+        Yields (key, cost) from the most expensive key, until the costs yielded are over percentage of the total
+        """
+        target_amount = (percentage / 100.0) * self.total(metric, positive_only)
+        current_amount = 0
+        for key, cost in self.descending(metric, positive_only):
+            yield key, cost
+            current_amount += cost
+            if current_amount > target_amount:
+                break
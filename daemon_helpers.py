@@ -0,0 +1,209 @@
+"""
+Helper functions to keep the report up to date in a long running process, and serve it over HTTP
+
+Every section is collected again on its own schedule (e.g. Cost Explorer reports hourly, inventories daily)
+by a single refresher thread, reusing the clients of the process. After every refresh the workbook and the
+JSON of every section are rendered once, so requests are answered from memory (or disk) without waiting.
+
+Endpoints
+-------
+GET /report.xlsx -- latest workbook of all the sections
+GET /sections -- when every section was refreshed, and when it is refreshed next
+GET /sections/<config.json key>.json -- latest rows of the section, as records of its headings
+GET /stats -- API calls and wall time of the sections since the daemon started
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from output_helpers import XlsxSink, RecordListSink, write_sheets
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_WORKBOOK_PATH = 'report.xlsx'
+DEFAULT_REFRESH_MINUTES = 24 * 60
+RETRY_MINUTES = 5  # a failed refresh is tried again after it, whatever the schedule of its sections
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def get_refresh_seconds(daemon_config, name):
+    """
+    Returns the refresh interval of the given section, from the "refresh_minutes" of the daemon setting
+    """
+    refresh_minutes = daemon_config.get("refresh_minutes", dict())
+    return 60 * refresh_minutes.get(name, daemon_config.get("default_refresh_minutes", DEFAULT_REFRESH_MINUTES))
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat(timespec="seconds") if timestamp else None
+
+
+class ReportDaemon:
+    """
+    Latest sheets of the sections, refreshed on their schedules
+
+    sections -- config.json keys of the sections, in the order of the workbook
+    collect -- function returning sheet against section name for a list of section names
+    dependencies -- list of the sections whose outputs a section needs, against section name,
+                    they are refreshed along with it
+    daemon_config -- the "daemon" setting
+    get_stats -- function returning JSON serializable stats of the process, for /stats
+    """
+
+    def __init__(self, sections, collect, dependencies, daemon_config, get_stats=dict):
+        self.sections = list(sections)
+        self.collect = collect
+        self.dependencies = dependencies
+        self.daemon_config = daemon_config
+        self.get_stats = get_stats
+        self.workbook_path = daemon_config.get("workbook_path", DEFAULT_WORKBOOK_PATH)
+        self.sheets = dict()
+        self.refreshed_at = dict()
+        self.next_refresh_at = {name: 0.0 for name in self.sections}
+        self.section_json = dict()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def due_sections(self):
+        """
+        Returns the sections to refresh now, along with the sections they depend on, in the order of the workbook
+        """
+        now = time.time()
+        due = set(name for name in self.sections if self.next_refresh_at[name] <= now)
+        for name in list(due):
+            due.update(self.dependencies.get(name, []))
+        return [name for name in self.sections if name in due]
+
+    def refresh(self, names):
+        """
+        Collects the given sections, then renders the workbook and the JSON of every section
+        """
+        print("\nRefreshing", ", ".join(names))
+        started = time.time()
+        replaced = []
+        try:
+            sheets = self.collect(names)
+            replaced = [self.sheets[name] for name in names if name in self.sheets]
+            self.sheets.update(sheets)
+            for name in names:
+                self.refreshed_at[name] = started
+                self.next_refresh_at[name] = started + get_refresh_seconds(self.daemon_config, name)
+            self.render()
+        except Exception as e:
+            # the refresher thread must outlive any failure, the previous outputs are served meanwhile
+            print(e)
+            print("Refresh failed, trying again in", RETRY_MINUTES, "minutes")
+            for name in names:
+                self.next_refresh_at[name] = time.time() + RETRY_MINUTES * 60
+        finally:
+            for sheet in replaced:
+                sheet.close()
+
+    def render(self):
+        """
+        Writes the workbook next to its path and moves it in place, so it is never served half written
+        """
+        temporary_path = self.workbook_path + ".tmp"
+        records = RecordListSink()
+        sheets = [(name, self.sheets[name]) for name in self.sections if name in self.sheets]
+        # sheets are kept open, they are written again after the next refresh
+        write_sheets([XlsxSink(temporary_path), records], sheets, close_sheets=False)
+        os.replace(temporary_path, self.workbook_path)
+        section_json = dict()
+        for name, sheet in sheets:
+            section_json[name] = json.dumps({
+                "section": name,
+                "name": sheet.name,
+                "refreshed_at": format_time(self.refreshed_at.get(name)),
+                "rows": records.records[name]
+            }, default=str).encode("utf-8")
+        with self.lock:
+            self.section_json = section_json
+
+    def run(self):
+        """
+        Refreshes the due sections until stop is called
+        """
+        while not self.stopped.is_set():
+            names = self.due_sections()
+            if names:
+                self.refresh(names)
+            wait = min(self.next_refresh_at.values()) - time.time()
+            if wait > 0:
+                self.stopped.wait(wait)
+
+    def stop(self):
+        self.stopped.set()
+
+    def get_index(self):
+        return [{
+            "section": name,
+            "refreshed_at": format_time(self.refreshed_at.get(name)),
+            "next_refresh_at": format_time(self.next_refresh_at[name]),
+            "json": "/sections/{}.json".format(name)
+        } for name in self.sections]
+
+    def serve_forever(self):
+        """
+        Starts refreshing the sections in the background and serves them until interrupted
+        """
+        refresher = threading.Thread(target=self.run, name="refresher", daemon=True)
+        refresher.start()
+        server = ThreadingHTTPServer((self.daemon_config.get("host", DEFAULT_HOST), self.daemon_config.get("port", DEFAULT_PORT)),
+                                     get_request_handler(self))
+        print("Serving the report at http://{}:{}/report.xlsx".format(*server.server_address))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stop()
+            refresher.join()
+
+
+def get_request_handler(daemon):
+    """
+    Returns a request handler class serving the given daemon
+    """
+    class ReportRequestHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/report.xlsx":
+                if not os.path.exists(daemon.workbook_path):
+                    return self.send_body(503, b"Report not collected yet", "text/plain")
+                with open(daemon.workbook_path, "rb") as workbook_file:
+                    return self.send_body(200, workbook_file.read(), XLSX_CONTENT_TYPE)
+            if path == "/sections":
+                return self.send_json(daemon.get_index())
+            if path == "/stats":
+                return self.send_json(daemon.get_stats())
+            if path.startswith("/sections/") and path.endswith(".json"):
+                name = path[len("/sections/"):-len(".json")]
+                with daemon.lock:
+                    body = daemon.section_json.get(name)
+                if name not in daemon.sections:
+                    return self.send_body(404, b"Unknown section", "text/plain")
+                if body is None:
+                    return self.send_body(503, b"Section not collected yet", "text/plain")
+                return self.send_body(200, body, "application/json")
+            self.send_body(404, b"Not found", "text/plain")
+
+        def send_json(self, value):
+            self.send_body(200, json.dumps(value, default=str).encode("utf-8"), "application/json")
+
+        def send_body(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReportRequestHandler
@@ -1,58 +1,190 @@
 """
 Helper functions to fetch details of different AWS EBS related resources
+
+Every function takes an optional EC2 client (default is the shared client of the default region),
+details are memoized separately for each client, so that regions can be scanned concurrently.
 """
 
 import re
-import boto3
+import threading
 from collections import defaultdict
+from fetch_helpers import get_ec2_reservations
+from client_helpers import get_client
+from throttle_helpers import is_throttling_error
+
+client_caches = dict() # memoized details against EC2 client, see get_cache
+client_caches_lock = threading.Lock()
+DEFAULT_PAGE_SIZE = 500
+MIN_PAGE_SIZE = 5
+MAX_PAGE_SIZES = {'describe_snapshots': 1000, 'describe_volumes': 500}
+
+
+def get_cache(client=None):
+    """
+    Returns memoized details of the given EC2 client:
+    "volume_details" -- volume name, instance id and instance name against volume id
+    "instance_details" -- instance name against instance id
+    "snapshot_to_ami" -- AMI details against snapshot id
+    "loaded" -- whether all volumes and instances are fetched in the above dicts
+    """
+    client = client or get_client("ec2")
+    with client_caches_lock:
+        if client not in client_caches:
+            client_caches[client] = {
+                "volume_details": dict(),
+                "instance_details": dict(),
+                "snapshot_to_ami": defaultdict(list),
+                "loaded": False
+            }
+        return client_caches[client]
+
+
+def clear_cache(client=None):
+    """
+    Forgets the memoized details of the given EC2 client, or of all the clients if None
+    """
+    with client_caches_lock:
+        if client is None:
+            client_caches.clear()
+        else:
+            client_caches.pop(client, None)
+
+
+def describe_pages(operation_name, result_key, page_size=DEFAULT_PAGE_SIZE, client=None, **kwargs):
+    """
+    Yields the result_key list of every page of the given EC2 describe operation, one page at a time,
+    so that the whole listing is never held in memory.
+    Operations which the installed botocore can't paginate (describe_images) are fetched in a single call.
+    """
+    client = client or get_client("ec2")
+    operation = getattr(client, operation_name)
+    if not client.can_paginate(operation_name):
+        yield operation(**kwargs)[result_key]
+        return
+    kwargs['MaxResults'] = max(MIN_PAGE_SIZE, min(page_size, MAX_PAGE_SIZES.get(operation_name, page_size)))
+    while True:
+        response = operation(**kwargs)
+        yield response[result_key]
+        next_token = response.get('NextToken')
+        if not next_token:
+            break
+        kwargs['NextToken'] = next_token
+
+
+def update_amis(page_size=DEFAULT_PAGE_SIZE, client=None):
+    """
+    Fetches all self owned AMIs and store the image info against snapshot id in "snapshot_to_ami"
+    """
+    snapshot_to_ami = get_cache(client)["snapshot_to_ami"]
+    snapshot_to_ami.clear()
+    for images in describe_pages('describe_images', 'Images', page_size, client, Owners=['self']):
+        for image in images:
+            image_id = image['ImageId']
+            image_name = image['Name']
+            for mapping in image.get('BlockDeviceMappings', []):
+                snapshot_id = mapping.get('Ebs', dict()).get('SnapshotId')
+                if snapshot_id:
+                    if not image_name:
+                        image_name = "No Name Set"
+                    snapshot_to_ami[snapshot_id].append({
+                        "name": image_name,
+                        "id": image_id
+                    })
+
+def update_instances(client=None, reservations=None):
+    """
+    Fetches all instances (unless reservations are given) and store their names against instance id in "instance_details"
+    """
+    instance_details = get_cache(client)["instance_details"]
+    if reservations is None:
+        reservations = get_ec2_reservations(client or get_client("ec2"))
+    for reservation in reservations:
+        for instance in reservation['Instances']:
+            instance_details[instance['InstanceId']] = get_name_from_tags(instance)
+
+
+def update_volumes(page_size=DEFAULT_PAGE_SIZE, client=None):
+    """
+    Fetches all volumes and store their details against volume id in "volume_details",
+    expects "instance_details" to be updated already
+    """
+    volume_details = get_cache(client)["volume_details"]
+    for volumes in describe_pages('describe_volumes', 'Volumes', page_size, client):
+        for volume in volumes:
+            volume_details[volume['VolumeId']] = get_volume_detail(volume, client)
+
+
+def update_indexes(page_size=DEFAULT_PAGE_SIZE, client=None, reservations=None):
+    """
+    Fetches all AMIs, instances and volumes with a few paginated calls, so that
+    snapshots are resolved with lookups instead of one call per volume and instance.
+    Instances are taken from reservations if given (e.g. already fetched by another report).
+    """
+    cache = get_cache(client)
+    cache["loaded"] = False
+    cache["volume_details"].clear()
+    cache["instance_details"].clear()
+    update_amis(page_size, client)
+    update_instances(client, reservations)
+    update_volumes(page_size, client)
+    cache["loaded"] = True
 
-ec2 = boto3.client("ec2")
-volume_details = dict() # to memoize volume name, instance id and instance name against volume id
-instance_details = dict() # to memoize instance name for an instance id
-snapshot_to_ami = defaultdict(list) # stores AMI details against snapshot id
 
-def update_amis():
+def get_name_from_tags(resource):
     """
-    Fetches all self owned AMIs and store the image info against snapshot id in "snapshot_to_image"
+    Returns value of the Name tag of resource, "No Name Set" if it has none
     """
-    images = ec2.describe_images(Owners=['self'])['Images']
-    for image in images:
-        image_id = image['ImageId']
-        image_name = image['Name']
-        for mapping in image.get('BlockDeviceMappings', []):
-            snapshot_id = mapping.get('Ebs', dict()).get('SnapshotId')
-            if snapshot_id:
-                if not image_name:
-                    image_name = "No Name Set"
-                snapshot_to_ami[snapshot_id].append({
-                    "name": image_name,
-                    "id": image_id
-                })
+    for tag in resource.get("Tags", []):
+        if tag['Key'] == 'Name':
+            return tag['Value']
+    return "No Name Set"
+
 
-def get_instance_name(instance_id):
+def get_instance_name(instance_id, client=None):
     """
     Returns instance name for the given instance_id, returns blank string if instance doesn't exists,
     and "No Name Set" in case instance exists but has no name assigned
 
     This function also memoize the instance details
     """
+    cache = get_cache(client)
+    instance_details = cache["instance_details"]
     if instance_id in instance_details:
         return instance_details[instance_id]
+    if cache["loaded"]:
+        # all instances are fetched already, so this one doesn't exist
+        return ""
     try:
-        instance = ec2.describe_instances(InstanceIds=[instance_id])['Reservations'][0]['Instances'][0]
+        instance = (client or get_client("ec2")).describe_instances(InstanceIds=[instance_id])['Reservations'][0]['Instances'][0]
     except Exception as e:
+        if is_throttling_error(e):
+            raise
         print(e)
         instance_details[instance_id] = ""
         return ""
-    instance_details[instance_id] = "No Name Set"
-    for tag in instance.get("Tags", []):
-        if tag['Key'] == 'Name':
-            instance_details[instance_id] = tag['Value']
-            break
+    instance_details[instance_id] = get_name_from_tags(instance)
     return instance_details[instance_id]
 
 
-def get_volume_details(volume_id):
+def get_volume_detail(volume, client=None):
+    """
+    Returns name and attached instances details of the given volume
+    """
+    instance_id = []
+    instance_name = []
+    for attachment in volume.get("Attachments", []):
+        current_instance_id = attachment.get("InstanceId")
+        if current_instance_id:
+            instance_id.append(current_instance_id)
+            instance_name.append(get_instance_name(current_instance_id, client))
+    return {
+        "name": get_name_from_tags(volume),
+        "instance_id": ", ".join(instance_id),
+        "instance_name": ", ".join(instance_name)
+    }
+
+
+def get_volume_details(volume_id, client=None):
     """
     Get Volume and Attached Instances Details for specified volume_id.
     In response, `instance_name` is blank string if instance doesn't exists
@@ -60,6 +192,8 @@ def get_volume_details(volume_id):
 
     This function also memoize the information
     """
+    cache = get_cache(client)
+    volume_details = cache["volume_details"]
     if volume_id in volume_details:
         return volume_details[volume_id]
     volume_detail = {
@@ -67,44 +201,32 @@ def get_volume_details(volume_id):
         "instance_id": "",
         "instance_name": ""
     }
-    # 
+    if cache["loaded"]:
+        # all volumes are fetched already, so this one doesn't exist
+        return volume_detail
     try:
         # try fetching volume information
-        volume = ec2.describe_volumes(VolumeIds=[volume_id])["Volumes"][0]
+        volume = (client or get_client("ec2")).describe_volumes(VolumeIds=[volume_id])["Volumes"][0]
     except Exception as e:
+        if is_throttling_error(e):
+            raise
         print(e)
         volume_details[volume_id] = volume_detail
         return volume_detail
-    # store volume name if available
-    volume_detail['name'] = "No Name Set"
-    for tag in volume.get("Tags", []):
-        if tag['Key'] == 'Name':
-            volume_detail['name'] = tag['Value']
-            break
-    # get instance information if available
-    instance_id = []
-    instance_name = []
-    for attachment in volume.get("Attachments", []):
-        current_instance_id = attachment.get("InstanceId")
-        if current_instance_id:
-            instance_id.append(current_instance_id)
-            instance_name.append(get_instance_name(current_instance_id))
-    # store instance information
-    volume_detail["instance_id"] = ", ".join(instance_id)
-    volume_detail["instance_name"] = ", ".join(instance_name)
-    volume_details[volume_id] = volume_detail
-    return volume_detail
+    volume_details[volume_id] = get_volume_detail(volume, client)
+    return volume_details[volume_id]
 
-def get_snapshots():
+def get_snapshots(page_size=DEFAULT_PAGE_SIZE, client=None, reservations=None):
     """
-    Get all snapshots.
+    Get all snapshots, fetched one page at a time.
+    reservations -- all EC2 reservations, if already fetched
     """
-    update_amis()
-    snapshots = ec2.describe_snapshots(OwnerIds=['self'])['Snapshots']
-    for snapshot in snapshots:
+    update_indexes(page_size, client, reservations)
+    snapshot_to_ami = get_cache(client)["snapshot_to_ami"]
+    for snapshot in get_self_owned_snapshots(page_size, client):
         snapshot_id = snapshot['SnapshotId']
         volume_id = snapshot['VolumeId']
-        volume_details = get_volume_details(volume_id)
+        volume_details = get_volume_details(volume_id, client)
         ami_id = ""
         ami_exists = False
         ami_name = ""
@@ -134,12 +256,20 @@ def get_snapshots():
         }
 
 
-def get_available_volumes():
+def get_self_owned_snapshots(page_size=DEFAULT_PAGE_SIZE, client=None):
+    """
+    Yields all self owned snapshots, fetched one page at a time
+    """
+    for snapshots in describe_pages('describe_snapshots', 'Snapshots', page_size, client, OwnerIds=['self']):
+        for snapshot in snapshots:
+            yield snapshot
+
+
+def get_available_volumes(page_size=DEFAULT_PAGE_SIZE, client=None):
     """
-    Get all volumes in 'available' state. (Volumes not attached to any instance)
+    Get all volumes in 'available' state, fetched one page at a time. (Volumes not attached to any instance)
     """
-    volumes = ec2.describe_volumes(Filters=[{'Name': 'status', 'Values': ['available']}])['Volumes']
-    for volume in volumes:
+    for volume in get_volumes_with_status('available', page_size, client):
         tags = [ "{} = {}".format(tag['Key'], tag['Value']) for tag in volume.get('Tags', [])]
         yield {
             'id': volume['VolumeId'],
@@ -148,4 +278,13 @@ def get_available_volumes():
             'size': volume['Size'],
             'snapshot_id': volume['SnapshotId'],
             'tags': ", ".join(tags),
-        }
\ No newline at end of file
+        }
+
+
+def get_volumes_with_status(status, page_size=DEFAULT_PAGE_SIZE, client=None):
+    """
+    Yields all volumes in the given state, fetched one page at a time
+    """
+    for volumes in describe_pages('describe_volumes', 'Volumes', page_size, client, Filters=[{'Name': 'status', 'Values': [status]}]):
+        for volume in volumes:
+            yield volume
@@ -0,0 +1,119 @@
+"""
+Helper functions to keep the tags of resources on disk between runs, against a change marker of every resource
+
+Markers come from the listings a run makes anyway (e.g. LastModified and RevisionId of a Lambda function,
+CreationDate of an S3 bucket), so later runs only fetch the tags of the resources which are new, changed, or
+stored longer than the TTL ago. Resources whose listings have no marker (DynamoDB tables, Kinesis and Firehose
+streams) are only fetched again after the TTL. Tagging a resource doesn't change its marker, the TTL bounds how
+long such a change goes unseen. Only tags are stored, never the details of a resource.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_INVENTORY_PATH = '.inventory.sqlite'
+DEFAULT_INVENTORY_TTL_DAYS = 7
+LOCK_TIMEOUT_SECONDS = 60
+WRITE_BATCH_SIZE = 500
+
+
+class InventoryStore:
+    """
+    SQLite store of tags against (kind, ARN), along with the marker of the resource they were fetched for
+
+    path -- path of the SQLite file
+    ttl_days -- days after which stored tags are fetched again, whatever the marker
+    force_refresh -- ignores what is stored, fetching (and storing) the tags of every resource again
+    """
+
+    def __init__(self, path=DEFAULT_INVENTORY_PATH, ttl_days=DEFAULT_INVENTORY_TTL_DAYS, force_refresh=False):
+        self.ttl_seconds = ttl_days * 24 * 60 * 60
+        self.force_refresh = force_refresh
+        self.lock = threading.Lock()
+        self.loaded = dict()
+        self.pending = []
+        self.hits = 0
+        self.misses = 0
+        # accounts of an organization are collected in parallel processes writing to the same file, each waits its turn
+        self.connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT_SECONDS, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS resources ("
+                "kind TEXT NOT NULL, arn TEXT NOT NULL, marker TEXT NOT NULL, tags TEXT NOT NULL, fetched_at REAL NOT NULL, "
+                "PRIMARY KEY (kind, arn))"
+            )
+            self.connection.execute("DELETE FROM resources WHERE fetched_at < ?", (time.time() - self.ttl_seconds,))
+
+    def load(self, kind):
+        """
+        Returns dict of (marker, tags, fetched at) against ARN of all the stored resources of kind, read from disk once
+        """
+        if kind not in self.loaded:
+            rows = self.connection.execute("SELECT arn, marker, tags, fetched_at FROM resources WHERE kind = ?", (kind,))
+            self.loaded[kind] = {arn: (marker, tags, fetched_at) for arn, marker, tags, fetched_at in rows}
+        return self.loaded[kind]
+
+    def get_tags(self, kind, arn, marker):
+        """
+        Returns the stored tags of the resource if they were fetched for the same marker, else None
+        """
+        with self.lock:
+            stored = None if self.force_refresh else self.load(kind).get(arn)
+            # a long running process may keep the store open beyond the TTL
+            if stored is None or stored[0] != str(marker) or stored[2] < time.time() - self.ttl_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(stored[1])
+
+    def put_tags(self, kind, arn, marker, tags):
+        """
+        Stores the tags fetched for marker, written to disk in batches of WRITE_BATCH_SIZE resources
+        """
+        with self.lock:
+            row = (kind, arn, str(marker), json.dumps(tags), time.time())
+            self.pending.append(row)
+            if kind in self.loaded:
+                self.loaded[kind][arn] = row[2:]
+            if len(self.pending) >= WRITE_BATCH_SIZE:
+                self.write_pending()
+
+    def flush(self):
+        """
+        Writes the tags stored since the last write to disk, e.g. at the end of every refresh of a long running process
+        """
+        with self.lock:
+            self.write_pending()
+
+    def write_pending(self):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO resources (kind, arn, marker, tags, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                self.pending
+            )
+        self.pending = []
+
+    def close(self):
+        with self.lock:
+            self.write_pending()
+            self.connection.close()
+        print("Inventory store:", self.hits, "resources unchanged,", self.misses, "fetched")
+
+
+def stored_tags_getter(store, kind, get_arn, get_marker, fetch):
+    """
+    Returns a get_tags(client, resource) function reading tags from store against get_arn(resource),
+    as long as get_marker(resource) didn't change. Other resources are looked up using
+    fetch(client, resource), and their tags stored for the next runs.
+    """
+    def get_tags(client, resource):
+        arn = get_arn(resource)
+        marker = get_marker(resource)
+        tags = store.get_tags(kind, arn, marker)
+        if tags is None:
+            tags = fetch(client, resource)
+            store.put_tags(kind, arn, marker, tags)
+        return tags
+    return get_tags
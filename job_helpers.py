@@ -0,0 +1,47 @@
+"""
+Helper functions to run jobs concurrently, in the order of their dependencies
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_MAX_WORKERS = 4
+
+
+def run_jobs(jobs, dependencies, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Runs every job as soon as the jobs it depends on are done, at most max_workers at a time.
+    Returns dict of job results against job name. If a job fails, its exception is raised
+    once the running jobs are done, and the jobs not started yet are skipped.
+
+    jobs -- dict of functions against job name, each function is called with a dict
+            of results of the jobs it depends on
+    dependencies -- dict of list of job names against job name
+    """
+    for name in jobs:
+        for dependency in dependencies.get(name, []):
+            if dependency not in jobs:
+                raise Exception("ERROR: Job {} depends on {} which is not going to run".format(name, dependency))
+
+    results = dict()
+    waiting = dict(jobs)
+    running = dict()  # job name against future
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        while waiting or running:
+            for name in list(waiting):
+                if all(dependency in results for dependency in dependencies.get(name, [])):
+                    job = waiting.pop(name)
+                    job_dependencies = {dependency: results[dependency] for dependency in dependencies.get(name, [])}
+                    running[executor.submit(job, job_dependencies)] = name
+            if not running:
+                raise Exception("ERROR: Circular dependency between jobs {}".format(", ".join(waiting)))
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception:
+                    waiting.clear()
+                    for pending in running:
+                        pending.cancel()
+                    raise
+    return results
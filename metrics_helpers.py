@@ -0,0 +1,188 @@
+"""
+Helper functions to measure where the time of a run goes
+
+Every client made by throttle_helpers.create_client reports its calls through botocore event hooks:
+count, continuation pages, bytes, retries, errors and a latency histogram, against the report
+section making the call and the service and operation. Sections report their wall time and rows.
+"""
+
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from sheet_helpers import Sheet, MAIN_HEADING
+
+NO_SECTION = '-'
+# upper bounds in seconds of the latency histogram buckets, the last bucket has no bound
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+# request parameters which are set only when fetching the pages after the first one
+PAGE_TOKEN_PARAMS = ['NextToken', 'Marker', 'PaginationToken', 'NextPageToken', 'position', 'ExclusiveStartTableName',
+                     'ExclusiveStartStreamName', 'ExclusiveStartDeliveryStreamName', 'ExclusiveStartTagKey']
+
+# section of the calls made by the current thread, see MetricsRecorder.section
+current_section = contextvars.ContextVar("current_section", default=NO_SECTION)
+
+
+def get_bucket_labels():
+    return ["<= {}s".format(bound) for bound in LATENCY_BUCKETS] + ["> {}s".format(LATENCY_BUCKETS[-1])]
+
+
+def new_api_stats():
+    return {
+        "calls": 0, "pages": 0, "retries": 0, "errors": 0, "bytes": 0,
+        "latency_seconds_total": 0.0, "latency_seconds_max": 0.0,
+        "latency_histogram": [0] * (len(LATENCY_BUCKETS) + 1)
+    }
+
+
+class MetricsRecorder:
+    """
+    Stats of API calls against (section, service, operation), and wall time and rows against section
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.apis = dict()
+            self.sections = dict()
+
+    def install(self, client):
+        """
+        Registers the recorder on the events of the given client
+        """
+        service = client.meta.service_model.service_name
+
+        def before_parameter_build(params, context, **kwargs):
+            context["metrics_page"] = any(params.get(param) for param in PAGE_TOKEN_PARAMS)
+
+        def before_call(context, **kwargs):
+            context["metrics_started"] = time.monotonic()
+            context["metrics_section"] = current_section.get()
+
+        def after_call(http_response, parsed, model, context, **kwargs):
+            size = len(getattr(http_response, "content", None) or b"")
+            retries = parsed.get('ResponseMetadata', dict()).get('RetryAttempts', 0)
+            # error responses (throttles, 4xx and 5xx) come through after-call too, after-call-error is for
+            # exceptions which got no response at all
+            self.record_call(context, service, model.name, size, retries, http_response.status_code >= 300)
+
+        def after_call_error(exception, context, event_name, **kwargs):
+            response = getattr(exception, "response", None) or dict()
+            retries = response.get('ResponseMetadata', dict()).get('RetryAttempts', 0)
+            self.record_call(context, service, event_name.split(".")[-1], 0, retries, True)
+
+        client.meta.events.register("before-parameter-build.*.*", before_parameter_build)
+        # first, so that the latency covers every other handler of the call
+        client.meta.events.register_first("before-call.*.*", before_call)
+        client.meta.events.register("after-call.*.*", after_call)
+        client.meta.events.register("after-call-error.*.*", after_call_error)
+        return client
+
+    def record_call(self, context, service, operation, size, retries, error):
+        latency = time.monotonic() - context.get("metrics_started", time.monotonic())
+        key = (context.get("metrics_section", current_section.get()), service, operation)
+        bucket = len(LATENCY_BUCKETS)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                bucket = index
+                break
+        with self.lock:
+            stats = self.apis.setdefault(key, new_api_stats())
+            stats["calls"] += 1
+            stats["pages"] += 1 if context.get("metrics_page") else 0
+            stats["retries"] += retries
+            stats["errors"] += 1 if error else 0
+            stats["bytes"] += size
+            stats["latency_seconds_total"] += latency
+            stats["latency_seconds_max"] = max(stats["latency_seconds_max"], latency)
+            stats["latency_histogram"][bucket] += 1
+
+    @contextmanager
+    def section(self, name):
+        """
+        Attributes the calls made within to the given section (also from threads started with
+        copied contexts, see tag_helpers.fetch_tags_concurrently), and records its wall time
+        """
+        token = current_section.set(name)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            current_section.reset(token)
+            with self.lock:
+                stats = self.sections.setdefault(name, {"wall_time_seconds": 0.0, "rows": 0})
+                stats["wall_time_seconds"] += time.monotonic() - started
+
+    def add_rows(self, name, rows):
+        with self.lock:
+            self.sections.setdefault(name, {"wall_time_seconds": 0.0, "rows": 0})["rows"] += rows
+
+    def to_dict(self):
+        """
+        Returns the stats as a JSON serializable dict
+        """
+        with self.lock:
+            return {
+                "sections": {name: dict(stats) for name, stats in self.sections.items()},
+                "apis": [dict(stats, section=key[0], service=key[1], operation=key[2],
+                              latency_histogram=list(stats["latency_histogram"]))
+                         for key, stats in sorted(self.apis.items())]
+            }
+
+    def merge(self, stats_dict):
+        """
+        Adds the stats given by to_dict of another recorder (e.g. of a worker process)
+        """
+        with self.lock:
+            for name, section_stats in stats_dict["sections"].items():
+                stats = self.sections.setdefault(name, {"wall_time_seconds": 0.0, "rows": 0})
+                stats["wall_time_seconds"] += section_stats["wall_time_seconds"]
+                stats["rows"] += section_stats["rows"]
+            for api_stats in stats_dict["apis"]:
+                stats = self.apis.setdefault((api_stats["section"], api_stats["service"], api_stats["operation"]), new_api_stats())
+                for field in ["calls", "pages", "retries", "errors", "bytes", "latency_seconds_total"]:
+                    stats[field] += api_stats[field]
+                stats["latency_seconds_max"] = max(stats["latency_seconds_max"], api_stats["latency_seconds_max"])
+                stats["latency_histogram"] = [count + other for count, other in zip(stats["latency_histogram"], api_stats["latency_histogram"])]
+
+
+# recorder shared by all the clients of the process
+recorder = MetricsRecorder()
+
+
+def write_stats_file(path, stats_dict, wall_time_seconds, startup_seconds=None):
+    """
+    Writes the stats with the wall time of the whole run (and the start-up time, if given) to a JSON file
+    """
+    extra = dict(wall_time_seconds=wall_time_seconds)
+    if startup_seconds is not None:
+        extra["startup_seconds"] = startup_seconds
+    with open(path, "w") as stats_file:
+        json.dump(dict(stats_dict, **extra), stats_file, indent=4)
+
+
+def get_stats_sheet(stats_dict, wall_time_seconds):
+    """
+    Returns the "Run Stats" sheet, a row for every section followed by a row for every API of it
+    """
+    stats_sheet = Sheet("Run Stats")
+    stats_sheet.add_row(["Section", "Service", "Operation", "Wall Time (s)", "Rows", "Calls", "Pages", "Retries", "Errors",
+                         "Bytes", "Total Latency (s)", "Max Latency (s)"] + get_bucket_labels(), MAIN_HEADING)
+    stats_sheet.set_column(0, 2, 30)
+    stats_sheet.set_column(3, 11 + len(LATENCY_BUCKETS) + 1, 14)
+    stats_sheet.add_row(["ALL SECTIONS", None, None, wall_time_seconds])
+    sections = sorted(set(stats_dict["sections"]) | set(api_stats["section"] for api_stats in stats_dict["apis"]))
+    for name in sections:
+        section_stats = stats_dict["sections"].get(name, dict())
+        stats_sheet.add_row([name, None, None, section_stats.get("wall_time_seconds"), section_stats.get("rows")])
+        for api_stats in stats_dict["apis"]:
+            if api_stats["section"] == name:
+                stats_sheet.add_row([name, api_stats["service"], api_stats["operation"], None, None, api_stats["calls"],
+                                     api_stats["pages"], api_stats["retries"], api_stats["errors"], api_stats["bytes"],
+                                     api_stats["latency_seconds_total"], api_stats["latency_seconds_max"]]
+                                    + api_stats["latency_histogram"])
+    return stats_sheet
@@ -0,0 +1,313 @@
+"""
+Helper functions to write the report sheets to any number of outputs (XLSX, CSV, JSON Lines, Parquet)
+
+Every enabled output is a sink, and the rows of each sheet are read once and fanned out to all
+the sinks in a single pass. The machine-readable sinks take the first row of a sheet as its
+column names and leave out the total rows, which can be computed from the data rows.
+"""
+
+import abc
+import csv
+import json
+import os
+import tempfile
+from sheet_helpers import add_formats, get_cell_runs, WORKBOOK_OPTIONS
+
+DEFAULT_OUTPUTS = {
+    "xlsx": {"enabled": True, "path": "report.xlsx"}
+}
+DEFAULT_CSV_DIRECTORY = 'report_csv'
+DEFAULT_JSONL_PATH = 'report.jsonl'
+DEFAULT_PARQUET_DIRECTORY = 'report_parquet'
+DEFAULT_PARQUET_BATCH_SIZE = 10000
+
+
+def get_unique_headings(headings):
+    """
+    Returns headings as strings, with a numeric suffix on the repeated ones (e.g. "Name (2)")
+    """
+    unique_headings = []
+    seen = dict()
+    for heading in headings:
+        heading = str(heading)
+        seen[heading] = seen.get(heading, 0) + 1
+        unique_headings.append(heading if seen[heading] == 1 else "{} ({})".format(heading, seen[heading]))
+    return unique_headings
+
+
+class XlsxSink:
+    """
+    Writes every sheet as a worksheet of a workbook, in constant_memory mode
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def open(self):
+        import xlsxwriter  # only needed once a workbook is written
+        self.workbook = xlsxwriter.Workbook(self.path, WORKBOOK_OPTIONS)
+        self.formats = add_formats(self.workbook)
+
+    def start_sheet(self, key, sheet):
+        # column widths go before the rows, as required by constant_memory mode
+        self.worksheet = self.workbook.add_worksheet(sheet.name)
+        self.row = 0
+        for first_col, last_col, width in sheet.columns:
+            self.worksheet.set_column(first_col, last_col, width)
+
+    def write_row(self, values, styles):
+        for first_col, run in get_cell_runs(values, styles):
+            self.worksheet.write_row(self.row, first_col, run, self.formats.get(styles[first_col]))
+        self.row += 1
+
+    def end_sheet(self):
+        self.worksheet = None
+
+    def close(self):
+        self.workbook.close()
+
+
+class RecordSink(abc.ABC):
+    """
+    Base of the machine-readable sinks, turns the rows of a sheet into records of its headings
+    """
+
+    def open(self):
+        pass
+
+    def start_sheet(self, key, sheet):
+        self.key = key
+        self.headings = None
+        self.total_rows = sheet.total_rows
+        self.row = 0
+
+    def write_row(self, values, styles):
+        if self.headings is None:
+            self.headings = get_unique_headings(values)
+            self.start_records()
+        elif self.row not in self.total_rows:
+            self.write_record(values + [None] * (len(self.headings) - len(values)))
+        self.row += 1
+
+    def start_records(self):
+        pass
+
+    @abc.abstractmethod
+    def write_record(self, values):
+        """
+        Writes a record, values are in the order of the headings
+        """
+
+    def end_sheet(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class CsvSink(RecordSink):
+    """
+    Writes every sheet as <directory>/<config.json key>.csv, with a header row
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.file = None
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def start_records(self):
+        self.file = open(os.path.join(self.directory, self.key + ".csv"), "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.headings)
+
+    def write_record(self, values):
+        self.writer.writerow(["" if value is None else value for value in values])
+
+    def end_sheet(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class JsonLinesSink(RecordSink):
+    """
+    Writes the rows of all the sheets to a single file, one JSON object per row,
+    with the config.json key of its sheet under "section"
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def open(self):
+        self.file = open(self.path, "w", encoding="utf-8")
+
+    def write_record(self, values):
+        record = {"section": self.key}
+        record.update(zip(self.headings, values))
+        self.file.write(json.dumps(record, default=str) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink(RecordSink):
+    """
+    Writes every sheet as <directory>/<config.json key>.parquet, in row groups of batch_size rows.
+    Every batch is written to a part file as soon as it is full, and the types of the columns are widened
+    along the way: columns with ints and floats become floats, columns with any other mix of types strings.
+    Once the sheet is done its parts are cast to the widened types and copied to the Parquet file.
+    Requires pyarrow, which is an optional dependency.
+    """
+
+    def __init__(self, directory, batch_size=DEFAULT_PARQUET_BATCH_SIZE):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise Exception("ERROR: Parquet output requires pyarrow, install it with `pip install pyarrow` :(")
+        self.pyarrow = pyarrow
+        self.directory = directory
+        self.batch_size = batch_size
+        self.parts = []
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def start_records(self):
+        self.batch = []
+        self.parts = []
+        # python types of the values of every column so far
+        self.column_types = [set() for _ in self.headings]
+
+    def write_record(self, values):
+        self.batch.append(values)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def get_column_type(self, types):
+        if not types:
+            return self.pyarrow.null()
+        if types == {bool}:
+            return self.pyarrow.bool_()
+        if types == {int}:
+            return self.pyarrow.int64()
+        if types <= {int, float}:
+            return self.pyarrow.float64()
+        return self.pyarrow.string()
+
+    def get_schema(self, column_types):
+        return self.pyarrow.schema([(heading, self.get_column_type(types)) for heading, types in zip(self.headings, column_types)])
+
+    def flush(self):
+        """
+        Writes the batch to a part file, with the types of its own values
+        """
+        if not self.batch:
+            return
+        columns = [list(column)[:len(self.headings)] for column in zip(*self.batch)]
+        batch_types = [set(type(value) for value in column if value is not None) for column in columns]
+        schema = self.get_schema(batch_types)
+        arrays = []
+        for field, column in zip(schema, columns):
+            if field.type == self.pyarrow.string():
+                column = [None if value is None else str(value) for value in column]
+            arrays.append(self.pyarrow.array(column, type=field.type))
+        part = tempfile.NamedTemporaryFile(suffix=".parquet", delete=False)
+        part.close()
+        self.pyarrow.parquet.write_table(self.pyarrow.Table.from_arrays(arrays, schema=schema), part.name)
+        self.parts.append(part.name)
+        for types, new_types in zip(self.column_types, batch_types):
+            types.update(new_types)
+        self.batch = []
+
+    def cast_part(self, table, schema):
+        """
+        Returns the table of a part file with the types of schema, values turned into strings are written as by str
+        """
+        arrays = []
+        for column, field in zip(table.columns, schema):
+            if field.type == self.pyarrow.string() and column.type not in (self.pyarrow.string(), self.pyarrow.null()):
+                column = self.pyarrow.array([None if value is None else str(value) for value in column.to_pylist()],
+                                            type=field.type)
+            arrays.append(column.cast(field.type))
+        return self.pyarrow.Table.from_arrays(arrays, schema=schema)
+
+    def end_sheet(self):
+        if self.headings is None:
+            return
+        self.flush()
+        # every column is a string as soon as one of its values was, even in the parts written before
+        schema = self.get_schema([types or {str} for types in self.column_types])
+        writer = self.pyarrow.parquet.ParquetWriter(os.path.join(self.directory, self.key + ".parquet"), schema)
+        try:
+            for part in self.parts:
+                writer.write_table(self.cast_part(self.pyarrow.parquet.read_table(part), schema))
+        finally:
+            writer.close()
+            for part in self.parts:
+                os.remove(part)
+            self.parts = []
+
+
+class RecordListSink(RecordSink):
+    """
+    Keeps the rows of every sheet in memory, as list of dicts of its headings against its config.json key
+    """
+
+    def __init__(self):
+        self.records = dict()
+
+    def start_records(self):
+        self.records[self.key] = []
+
+    def write_record(self, values):
+        self.records[self.key].append(dict(zip(self.headings, values)))
+
+
+def get_sinks(outputs_config):
+    """
+    Returns sinks of the enabled outputs of the "outputs" setting, just the XLSX workbook if it is empty
+    """
+    outputs_config = outputs_config or DEFAULT_OUTPUTS
+    sinks = []
+    xlsx_config = outputs_config.get("xlsx", dict())
+    if xlsx_config.get("enabled", False):
+        sinks.append(XlsxSink(xlsx_config.get("path", DEFAULT_OUTPUTS["xlsx"]["path"])))
+    csv_config = outputs_config.get("csv", dict())
+    if csv_config.get("enabled", False):
+        sinks.append(CsvSink(csv_config.get("directory", DEFAULT_CSV_DIRECTORY)))
+    jsonl_config = outputs_config.get("jsonl", dict())
+    if jsonl_config.get("enabled", False):
+        sinks.append(JsonLinesSink(jsonl_config.get("path", DEFAULT_JSONL_PATH)))
+    parquet_config = outputs_config.get("parquet", dict())
+    if parquet_config.get("enabled", False):
+        sinks.append(ParquetSink(parquet_config.get("directory", DEFAULT_PARQUET_DIRECTORY),
+                                 parquet_config.get("batch_size", DEFAULT_PARQUET_BATCH_SIZE)))
+    if not sinks:
+        raise Exception("ERROR: No output is enabled in settings.outputs :(")
+    return sinks
+
+
+def write_sheets(sinks, sheets, close_sheets=True):
+    """
+    Writes the given list of (config.json key, sheet) to all the sinks, reading the rows of every sheet once.
+    Sheets are closed once written, unless close_sheets is False.
+    """
+    for sink in sinks:
+        sink.open()
+    try:
+        for key, sheet in sheets:
+            for sink in sinks:
+                sink.start_sheet(key, sheet)
+            for values, styles in sheet.iter_rows():
+                for sink in sinks:
+                    sink.write_row(values, styles)
+            for sink in sinks:
+                sink.end_sheet()
+            if close_sheets:
+                sheet.close()
+    finally:
+        for sink in sinks:
+            sink.close()
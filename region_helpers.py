@@ -0,0 +1,55 @@
+"""
+Helper functions to run the report over multiple regions, with one set of clients per region
+"""
+
+from catalog_helpers import ResourceCatalog
+from client_helpers import get_client
+
+ALL_REGIONS = "all"
+
+
+def get_enabled_regions(client):
+    """
+    Returns names of all the regions enabled for the account, using the given EC2 client
+    """
+    return sorted(region['RegionName'] for region in client.describe_regions()['Regions'])
+
+
+def get_regions(regions_setting, pool):
+    """
+    Returns list of regions to run the report in, from the "regions" setting:
+    a list of region names, "all" for all enabled regions, or empty for just the default region (None)
+
+    pool -- ClientPool whose EC2 client lists the enabled regions, created only for "all"
+    """
+    if not regions_setting:
+        return [None]
+    if regions_setting == ALL_REGIONS:
+        return get_enabled_regions(pool.client("ec2"))
+    return list(regions_setting)
+
+
+class ClientPool:
+    """
+    Clients of a single region (from the shared registry of client_helpers), used by all the sections
+    of the region, along with the catalog of the region's resources
+
+    region -- region name, None for the default region
+    credentials -- keyword arguments of boto3.Session (e.g. of an assumed role), None for the default credentials
+    inventory -- InventoryStore of the tags fetched by earlier runs, None to fetch all of them
+    """
+
+    def __init__(self, region=None, credentials=None, inventory=None):
+        self.region = region
+        self.credentials = credentials
+        self.catalog = ResourceCatalog(self)
+        self.inventory = inventory
+
+    def refresh(self):
+        """
+        Starts a new catalog, so that the resources are fetched again by the next sections
+        """
+        self.catalog = ResourceCatalog(self)
+
+    def client(self, service_name):
+        return get_client(service_name, self.region, self.credentials)
@@ -0,0 +1,185 @@
+"""
+Helper functions to buffer the rows of a report sheet and write them to the workbook later
+
+Sheets keep a bounded number of rows in memory and spill the rest to a temporary file, and
+the workbook is written in xlsxwriter's constant_memory mode, row by row in order (see output_helpers),
+so memory stays flat however large the sheets get.
+"""
+
+import pickle
+import tempfile
+
+# constants
+MAIN_HEADING_BG_COLOR = '#0080ff'
+MAIN_HEADING_FONT_COLOR = '#ffffff'
+MAIN_HEADING_FONT_SIZE = 13
+SUB_HEADING_BG_COLOR = '#969696'
+SUB_HEADING_FONT_COLOR = '#ffffff'
+SUB_HEADING_FONT_SIZE = 13
+CELL_FONT_SIZE = 13
+GREEN_FONT_COLOR = '#037d50'
+RED_FONT_COLOR = '#cc0000'
+MAX_ROWS_IN_MEMORY = 10000
+WORKBOOK_OPTIONS = {'constant_memory': True}
+
+# cell styles, formats are created for each of them when the sheet is written
+MAIN_HEADING = 'main_heading'
+SUB_HEADING = 'sub_heading'
+GENERIC_CELL = 'generic_cell'
+GREEN_TEXT_CELL = 'green_text_cell'
+RED_TEXT_CELL = 'red_text_cell'
+
+STYLE_PROPERTIES = {
+    MAIN_HEADING: {
+        'font_color': MAIN_HEADING_FONT_COLOR,
+        'bg_color': MAIN_HEADING_BG_COLOR,
+        'valign': 'vcenter', 'border': 1,
+        'font_size': MAIN_HEADING_FONT_SIZE
+    },
+    SUB_HEADING: {
+        'font_color': SUB_HEADING_FONT_COLOR,
+        'bg_color': SUB_HEADING_BG_COLOR,
+        'valign': 'vcenter', 'border': 1,
+        'font_size': SUB_HEADING_FONT_SIZE
+    },
+    GENERIC_CELL: {
+        'valign': 'vcenter', 'border': 1,
+        'font_size': CELL_FONT_SIZE
+    },
+    GREEN_TEXT_CELL: {
+        'valign': 'vcenter', 'border': 1,
+        'font_size': CELL_FONT_SIZE,
+        'font_color': GREEN_FONT_COLOR
+    },
+    RED_TEXT_CELL: {
+        'valign': 'vcenter', 'border': 1,
+        'font_size': CELL_FONT_SIZE,
+        'font_color': RED_FONT_COLOR
+    },
+}
+
+
+class Sheet:
+    """
+    Rows of a report sheet, collected by a section and written to the workbook once all sections are done.
+
+    name -- name of the worksheet
+    columns -- list of (first_col, last_col, width) column widths
+    rows -- list of the latest (values, styles) tuples, a value of None leaves the cell empty,
+            iter_rows gives all of them
+    outputs -- values computed by the section which other sections depend on
+    total_rows -- indexes (in the order of iter_rows) of the rows added with add_total_row
+    max_rows_in_memory -- rows beyond it are spilled to a temporary file
+    """
+
+    def __init__(self, name, max_rows_in_memory=MAX_ROWS_IN_MEMORY):
+        self.name = name
+        self.columns = []
+        self.rows = []
+        self.outputs = dict()
+        self.total_rows = set()
+        self.max_rows_in_memory = max_rows_in_memory
+        self.spill_file = None
+        self.spilled_rows = 0
+
+    def set_column(self, first_col, last_col, width):
+        self.columns.append((first_col, last_col, width))
+
+    def add_row(self, values, styles=GENERIC_CELL):
+        """
+        styles -- style for all the values, or a list with style for each value
+        """
+        if not isinstance(styles, list):
+            styles = [styles] * len(values)
+        self.rows.append((list(values), styles))
+        if len(self.rows) >= self.max_rows_in_memory:
+            self.spill()
+
+    def add_total_row(self, values, styles=SUB_HEADING):
+        """
+        Adds a row totalling the rows above it, which the machine-readable outputs leave out
+        """
+        self.total_rows.add(self.count_rows())
+        self.add_row(values, styles)
+
+    def spill(self):
+        """
+        Moves the rows in memory to the end of the temporary file
+        """
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile()
+        self.spill_file.seek(0, 2)
+        for row in self.rows:
+            pickle.dump(row, self.spill_file, pickle.HIGHEST_PROTOCOL)
+        self.spilled_rows += len(self.rows)
+        self.rows = []
+
+    def count_rows(self):
+        return self.spilled_rows + len(self.rows)
+
+    def iter_rows(self):
+        """
+        Yields all the (values, styles) rows in the order they were added
+        """
+        if self.spill_file is not None:
+            self.spill_file.seek(0)
+            for _ in range(self.spilled_rows):
+                yield pickle.load(self.spill_file)
+        for row in self.rows:
+            yield row
+
+    def close(self):
+        """
+        Removes the temporary file of spilled rows, if any
+        """
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+            self.spilled_rows = 0
+
+    def __getstate__(self):
+        # sheets of worker processes are sent back with all their rows in memory
+        return dict(self.__dict__, rows=list(self.iter_rows()), spill_file=None, spilled_rows=0)
+
+
+def add_formats(workbook):
+    """
+    Returns dict of workbook formats against style
+    """
+    return {style: workbook.add_format(properties) for style, properties in STYLE_PROPERTIES.items()}
+
+
+def get_cell_runs(values, styles):
+    """
+    Yields (first col, values) of the runs of consecutive cells with the same style, skipping empty cells
+    """
+    first_col = None
+    for col, value in enumerate(values + [None]):
+        if first_col is not None and (value is None or styles[col] != styles[first_col]):
+            yield first_col, values[first_col:col]
+            first_col = None
+        if first_col is None and value is not None:
+            first_col = col
+
+
+def merge_sheets(sheets, labels, label_heading):
+    """
+    Returns a single sheet with the rows of all the given sheets (of the same section),
+    with a first column of label_heading holding the label of the sheet each row came from.
+    The heading row is taken from the first sheet only, total rows stay total rows, labelled in their style.
+    """
+    merged = Sheet(sheets[0].name)
+    merged.set_column(0, 0, 20)
+    for first_col, last_col, width in sheets[0].columns:
+        merged.set_column(first_col + 1, last_col + 1, width)
+    for index, (sheet, label) in enumerate(zip(sheets, labels)):
+        for row, (values, styles) in enumerate(sheet.iter_rows()):
+            if row == 0:
+                if index == 0:
+                    merged.add_row([label_heading] + values, [styles[0]] + styles)
+            elif row in sheet.total_rows:
+                merged.add_total_row([label] + values, [styles[0]] + styles)
+            else:
+                merged.add_row([label] + values, [GENERIC_CELL] + styles)
+        sheet.close()
+    return merged
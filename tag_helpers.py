@@ -0,0 +1,132 @@
+"""
+Helper functions to fetch tags of different AWS Resources, in bulk or concurrently across a bounded pool of workers
+"""
+
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from throttle_helpers import is_throttling_error
+
+DEFAULT_CONCURRENCY = 10
+# resource types looked up in bulk through the Resource Groups Tagging API,
+# EC2 instances are left out as describe_instances already returns their tags
+BULK_TAG_RESOURCE_TYPES = ['lambda:function', 'dynamodb:table', 'kinesis:stream', 'firehose:deliverystream', 's3']
+BULK_TAG_PAGE_SIZE = 100
+PENDING_PER_WORKER = 4  # max pending fetches per worker, keeps memory bounded for huge listings
+
+
+def get_tags_dict_from_list(tag_list):
+    tags = dict()
+    for tag_dict in tag_list:
+        tags[tag_dict['Key']] = tag_dict['Value']
+    return tags
+
+
+def get_lambda_function_tags(client, function):
+    return client.list_tags(Resource=function['FunctionArn']).get('Tags', dict())
+
+
+def get_dynamodb_table_tags(client, table, table_arn=None):
+    if table_arn is None:
+        table_arn = client.describe_table(TableName=table)['Table']['TableArn']
+    tag_response = client.list_tags_of_resource(ResourceArn=table_arn)
+    tag_list = tag_response.get('Tags', [])
+    next_token = tag_response.get('NextToken')
+    while next_token is not None:
+        tag_response = client.list_tags_of_resource(ResourceArn=table_arn, NextToken=next_token)
+        tag_list.extend(tag_response['Tags'])
+        next_token = tag_response.get('NextToken')
+    return get_tags_dict_from_list(tag_list)
+
+
+def get_kinesis_stream_tags(client, stream):
+    tag_response = client.list_tags_for_stream(StreamName=stream)
+    tag_list = tag_response['Tags']
+    has_more_tags = tag_response.get('HasMoreTags', False)
+    while has_more_tags:
+        tag_response = client.list_tags_for_stream(StreamName=stream, ExclusiveStartTagKey=tag_list[-1]['Key'])
+        tag_list.extend(tag_response['Tags'])
+        has_more_tags = tag_response.get('HasMoreTags', False)
+    return get_tags_dict_from_list(tag_list)
+
+
+def get_firehose_delivery_stream_tags(client, stream):
+    tag_response = client.list_tags_for_delivery_stream(DeliveryStreamName=stream)
+    tag_list = tag_response['Tags']
+    has_more_tags = tag_response.get('HasMoreTags', False)
+    while has_more_tags:
+        tag_response = client.list_tags_for_delivery_stream(DeliveryStreamName=stream, ExclusiveStartTagKey=tag_list[-1]['Key'])
+        tag_list.extend(tag_response['Tags'])
+        has_more_tags = tag_response.get('HasMoreTags', False)
+    return get_tags_dict_from_list(tag_list)
+
+
+def get_s3_bucket_tags(client, bucket_name):
+    try:
+        tag_list = client.get_bucket_tagging(Bucket=bucket_name)['TagSet']
+    except Exception as e:
+        if is_throttling_error(e):
+            raise
+        print(e)
+        tag_list = []
+    return get_tags_dict_from_list(tag_list)
+
+
+def get_bulk_tags_index(client, resource_types=BULK_TAG_RESOURCE_TYPES):
+    """
+    Pages through get_resources of the Resource Groups Tagging API once and returns a dict of tags against ARN.
+
+    Only resources which are (or once were) tagged are returned by the API, so a resource missing
+    from the index has no tags. S3 buckets are an exception since the API only returns the buckets
+    of the client's region, use indexed_tags_getter with a fallback for them.
+    """
+    tags_index = dict()
+    kwargs = {}
+    while True:
+        response = client.get_resources(ResourceTypeFilters=resource_types, ResourcesPerPage=BULK_TAG_PAGE_SIZE, **kwargs)
+        for mapping in response.get('ResourceTagMappingList', []):
+            tags_index[mapping['ResourceARN']] = get_tags_dict_from_list(mapping.get('Tags', []))
+        token = response.get('PaginationToken')
+        if not token:
+            break
+        kwargs = {'PaginationToken': token}
+    return tags_index
+
+
+def indexed_tags_getter(tags_index, get_arn, fallback=None):
+    """
+    Returns a get_tags(client, resource) function reading tags from tags_index against get_arn(resource).
+    Resources missing from the index are looked up using fallback(client, resource) if given,
+    else are considered to have no tags.
+    """
+    def get_tags(client, resource):
+        arn = get_arn(resource)
+        if arn in tags_index:
+            return tags_index[arn]
+        if fallback is not None:
+            return fallback(client, resource)
+        return dict()
+    return get_tags
+
+
+def fetch_tags_concurrently(client, resources, get_tags, max_workers=DEFAULT_CONCURRENCY):
+    """
+    Calls get_tags(client, resource) for every resource on a pool of max_workers threads
+    and yields (resource, tags) tuples in the same order as resources, so the output
+    is identical to a serial run.
+
+    At most max_workers * PENDING_PER_WORKER fetches are pending at any time, so
+    resources can be a lazy iterator of any size. Fetches run in a copy of the caller's
+    context, so their calls are attributed to the caller's report section.
+    """
+    max_workers = max(1, max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for resource in resources:
+            pending.append((resource, executor.submit(contextvars.copy_context().run, get_tags, client, resource)))
+            if len(pending) >= max_workers * PENDING_PER_WORKER:
+                resource, future = pending.popleft()
+                yield resource, future.result()
+        while pending:
+            resource, future = pending.popleft()
+            yield resource, future.result()
@@ -1,60 +1,232 @@
 """
-Tags resources with specified tag values in form of a CSV File 
+Tags resources with specified tag values in form of a CSV File
 
 Usage
 -------
 Expects a file to_tag.csv with columns Resource,Name,Tag:Name,Tag:<tagname1>,Tag:<tagname1>,...
 Make sure the column names are present on the first row in the sequence as stated above
 Here Resource can be: DynamoDB Table, Firehose Delivery Stream, Kinesis Stream, S3 Bucket, Lambda Function
+
+ARNs are built from the names with the account and region of the credentials, and resources with the same
+tags are tagged together, up to 20 per call. Resources which fail to be tagged are listed at the end.
 """
 
-import boto3
+import argparse
 import csv
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from arn_helpers import get_caller_details, build_arn
+from client_helpers import get_client, configure_pool_connections
+from throttle_helpers import is_throttling_code
+
+MAX_BATCH_SIZE = 20  # ARNs of a tag_resources call
+MAX_TAG_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 1
+RETRYABLE_ERROR_CODES = {'InternalServiceException'}
+DEFAULT_WORKERS = 8
+DEFAULT_JOURNAL_PATH = 'to_tag.journal'
+QUEUED_BATCHES_PER_WORKER = 2
+MAX_OPEN_GROUPS = 1000  # batches of distinct tags filling up at the same time in pipeline mode
+# resource types of the Resource column, other rows are skipped
+TAGGABLE_TYPES = ("DynamoDB Table", "Firehose Delivery Stream", "Kinesis Stream", "S3 Bucket", "Lambda Function")
+QUEUE_TIMEOUT_SECONDS = 1
+JOURNAL_DIGEST_SIZE = 8  # bytes, collisions (i.e. resources wrongly skipped) are negligible below billions of rows  # how often a blocked producer checks that workers are left
+
+
+def is_retryable_failure(failure):
+    """
+    Returns whether a FailedResourcesMap entry may succeed if tried again
+    """
+    error_code = failure.get('ErrorCode')
+    return error_code in RETRYABLE_ERROR_CODES or is_throttling_code(error_code) or failure.get('StatusCode', 0) >= 500
+
 
-def tag_resources(resources, batch_size=20):
+def group_by_tags(resources):
     """
+    Returns list of (tags, ARNs) of the resources having the very same tags, in the order of resources
+    """
+    groups = OrderedDict()
+    for resource in resources:
+        groups.setdefault(tuple(sorted(resource['tags'].items())), []).append(resource['arn'])
+    return [(dict(tags), arns) for tags, arns in groups.items()]
+
+
+def tag_batch(client, tags, batch):
+    """
+    Tags the given ARNs (at most 20) with tags, trying again the ones which failed with a retryable error.
+    Returns dict of FailedResourcesMap entries against ARN, of the resources which could not be tagged.
+    """
+    failed = dict()
+    for attempt in range(1, MAX_TAG_ATTEMPTS + 1):
+        response = client.tag_resources(ResourceARNList=batch, Tags=tags)
+        failures = response.get('FailedResourcesMap', dict())
+        for arn in batch:
+            if arn not in failures:
+                print(arn, response['ResponseMetadata']['HTTPStatusCode'])
+                failed.pop(arn, None)
+            else:
+                print(arn, failures[arn].get('StatusCode'), failures[arn].get('ErrorCode'), failures[arn].get('ErrorMessage'))
+                failed[arn] = failures[arn]
+        # only the resources which failed with a retryable error are tagged again
+        batch = [arn for arn in batch if arn in failures and is_retryable_failure(failures[arn])]
+        if not batch:
+            break
+        if attempt < MAX_TAG_ATTEMPTS:
+            print("Retrying", len(batch), "resources...")
+            time.sleep(RETRY_DELAY_SECONDS * 2 ** (attempt - 1))
+    return failed
+
+
+def tag_resources(resources, batch_size=MAX_BATCH_SIZE):
+    """
+    Returns dict of FailedResourcesMap entries against ARN, of the resources which could not be tagged
+
     resources -- list of resources dictionary having keys "arn" (string) and "tags" (dict)
-    batch_size -- batch size for calling tag resources API (default is 20)
-    """
-    client = boto3.client('resourcegroupstaggingapi')
-
-    for index in range(0, len(resources), batch_size):
-        batch = resources[index:index+batch_size]
-        for resource in batch:
-            response = client.tag_resources(
-                ResourceARNList=[
-                    resource['arn'],
-                ],
-                Tags=resource['tags']
-            )
-            print(resource['arn'], response['ResponseMetadata']['HTTPStatusCode'])
-
-def get_arn(resource_type, name):
-    """
-    Returns ARN for the given resource type and name
-    """
-    if resource_type == "DynamoDB Table":
-        client = boto3.client("dynamodb")
-        return client.describe_table(TableName=name)['Table']['TableArn']
-    elif resource_type == "Firehose Delivery Stream":
-        client = boto3.client("firehose")
-        return client.describe_delivery_stream(DeliveryStreamName=name)['DeliveryStreamDescription']['DeliveryStreamARN']
-    elif resource_type == "Kinesis Stream":
-        client = boto3.client("kinesis")
-        return client.describe_stream(StreamName=name)['StreamDescription']['StreamARN']
-    elif resource_type == "S3 Bucket":
-        return "arn:aws:s3:::{}".format(name)
-    elif resource_type == "Lambda Function":
-        client = boto3.client("lambda")
-        return client.get_function(FunctionName=name)['Configuration']['FunctionArn']
-    return None
-
-with open("to_tag.csv") as csv_file:
-    csv_reader = csv.reader(csv_file)
+    batch_size -- max number of ARNs of a tag resources API call (default is 20, the max allowed by the API)
+    """
+    client = get_client('resourcegroupstaggingapi')
+
+    failed = dict()
+    for tags, arns in group_by_tags(resources):
+        for index in range(0, len(arns), batch_size):
+            failed.update(tag_batch(client, tags, arns[index:index+batch_size]))
+    return failed
+
+
+def get_journal_key(arn, tags):
+    return json.dumps([arn, tags], sort_keys=True)
+
+
+def get_journal_digest(key):
+    """
+    Returns a 64 bit digest of the journal key, what is kept in memory of every resource already tagged
+    """
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=JOURNAL_DIGEST_SIZE).digest(), "big")
+
+
+def read_journal(journal_path):
+    """
+    Returns set of digests of the journal keys of the resources tagged by earlier runs
+    """
+    if not os.path.exists(journal_path):
+        return set()
+    with open(journal_path) as journal_file:
+        return set(get_journal_digest(line.rstrip("\n")) for line in journal_file if line.endswith("\n"))
+
+
+def batch_by_tags(resources, batch_size=MAX_BATCH_SIZE, max_open_groups=MAX_OPEN_GROUPS):
+    """
+    Yields (tags, list of resources) batches of the resources having the same tags, as soon as a batch is full.
+    At most max_open_groups batches are kept open, the oldest one is yielded beyond it, so memory stays bounded.
+    """
+    groups = OrderedDict()
+    for resource in resources:
+        key = tuple(sorted(resource['tags'].items()))
+        group = groups.setdefault(key, [])
+        group.append(resource)
+        if len(group) >= batch_size:
+            yield resource['tags'], groups.pop(key)
+        elif len(groups) > max_open_groups:
+            key, group = groups.popitem(last=False)
+            yield dict(key), group
+    for key, group in groups.items():
+        yield dict(key), group
+
+
+def pipeline_tag_resources(resources, workers=DEFAULT_WORKERS, journal_path=DEFAULT_JOURNAL_PATH):
+    """
+    Tags a stream of resources (as of tag_resources) on workers threads, fed batches through a bounded queue,
+    and appends every tagged resource to the journal, so that resources tagged by an earlier run are skipped.
+    Returns (number of resources tagged, dict of FailedResourcesMap entries against ARN of the ones which could not be).
+    """
+    client = get_client('resourcegroupstaggingapi')
+    done = read_journal(journal_path)
+    if done:
+        print("Skipping", len(done), "resources tagged by earlier runs, as of", journal_path)
+    batches = queue.Queue(maxsize=workers * QUEUED_BATCHES_PER_WORKER)
+    lock = threading.Lock()
+    failed = dict()
+    tagged = [0]
+
+    def work():
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            tags, batch_resources = batch
+            journaled = set()
+            try:
+                batch_failed = tag_batch(client, tags, [resource['arn'] for resource in batch_resources])
+                with lock:
+                    for resource in batch_resources:
+                        if resource['arn'] not in batch_failed:
+                            journal_file.write(resource['key'] + "\n")
+                            journaled.add(resource['arn'])
+                            tagged[0] += 1
+                    journal_file.flush()
+                    failed.update(batch_failed)
+            except Exception as e:
+                # whatever failed (tagging or writing the journal), the worker goes on with the next batches,
+                # and resources left out of the journal are tagged again by the next run
+                print(e)
+                with lock:
+                    for resource in batch_resources:
+                        if resource['arn'] not in journaled:
+                            failed[resource['arn']] = {'ErrorCode': type(e).__name__, 'ErrorMessage': str(e)}
+
+    def put(item):
+        """
+        Queues item, waiting while the queue is full as long as a worker is left to take it.
+        Returns whether it was queued.
+        """
+        while any(thread.is_alive() for thread in threads):
+            try:
+                batches.put(item, timeout=QUEUE_TIMEOUT_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    with open(journal_path, "a") as journal_file:
+        threads = [threading.Thread(target=work, name="tagger-{}".format(index)) for index in range(workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            pending = (dict(resource, key=get_journal_key(resource['arn'], resource['tags'])) for resource in resources)
+            for batch in batch_by_tags(resource for resource in pending if get_journal_digest(resource['key']) not in done):
+                # blocks while all the workers are busy, so the CSV is read only as fast as it is tagged
+                if not put(batch):
+                    raise Exception("ERROR: All the tagging workers stopped :(")
+        finally:
+            for thread in threads:
+                put(None)
+            for thread in threads:
+                thread.join()
+    return tagged[0], failed
+
+
+def get_arn(resource_type, name, region, caller):
+    """
+    Returns ARN for the given resource type and name, None if the resource type is not supported
+
+    caller -- account id and partition of the credentials, see arn_helpers.get_caller_details
+    """
+    if resource_type not in TAGGABLE_TYPES:
+        return None
+    return build_arn(resource_type, name, region, caller["account_id"], caller["partition"])
+
+
+def read_resources(csv_reader, region, caller):
+    """
+    Yields resources (as of tag_resources) of the rows of the CSV file, one row at a time
+    """
     line_count = 0
-    resources = []
     tag_keys = []
-    print("Reading from csv...might take a while")
     for row in csv_reader:
         if line_count == 0:
             for index in range(0, len(row)-2):
@@ -62,13 +234,46 @@ with open("to_tag.csv") as csv_file:
                 tag_keys.append(row[index+2][4:])
             print("Tags to be added :", ",".join(tag_keys))
         else:
-            arn = get_arn(row[0], row[1])
+            arn = get_arn(row[0], row[1], region, caller)
             if arn:
                 tags = dict()
                 for index, value in enumerate(tag_keys):
                     tags[value] = row[index+2]
-                resource = {"arn": arn, "tags": tags}
-                resources.append(resource)
+                yield {"arn": arn, "tags": tags}
         line_count += 1
-    print("Tagging now...")
-    tag_resources(resources)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tags the resources of to_tag.csv")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="tag while reading the CSV file, on concurrent workers, skipping the resources in the journal")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="number of tagging workers in pipeline mode")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_PATH, help="journal of the tagged resources in pipeline mode")
+    args = parser.parse_args()
+    if args.pipeline:
+        # the workers share a single client
+        configure_pool_connections(args.workers)
+
+    with open("to_tag.csv") as csv_file:
+        csv_reader = csv.reader(csv_file)
+        # a single lookup of the account and region, every ARN is built from them
+        caller = get_caller_details(get_client("sts"))
+        region = get_client("resourcegroupstaggingapi").meta.region_name
+        print("Reading from csv...might take a while")
+        resources = read_resources(csv_reader, region, caller)
+        if args.pipeline:
+            print("Tagging while reading...")
+            tagged, failed = pipeline_tag_resources(resources, max(1, args.workers), args.journal)
+            print(tagged, "resources tagged")
+        else:
+            resources = list(resources)
+            print("Tagging now...")
+            failed = tag_resources(resources)
+        if failed:
+            print(len(failed), "resources could not be tagged:")
+            for arn, failure in failed.items():
+                print(arn, failure.get('ErrorCode'), failure.get('ErrorMessage'))
+
+
+if __name__ == "__main__":
+    main()
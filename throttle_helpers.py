@@ -0,0 +1,168 @@
+"""
+Helper functions to keep every AWS call under the rate AWS allows, instead of failing on throttling
+
+Clients made with create_client go through a shared rate limiter: every API (service and operation of a
+region) has its own token bucket, whose rate is halved whenever AWS throttles a call and raised again
+step by step as calls succeed. Throttled calls are retried by botocore's standard retry mode, with
+exponential backoff and jitter, so rows are no longer dropped because of throttling.
+"""
+
+import threading
+import time
+from botocore.exceptions import ClientError
+from metrics_helpers import recorder
+
+DEFAULT_MAX_ATTEMPTS = 10
+DEFAULT_MAX_RATE = 50.0  # calls per second of a single API
+DEFAULT_MIN_RATE = 0.5
+RATE_DECREASE_FACTOR = 0.5
+RATE_INCREASE_STEP = 0.5
+THROTTLING_ERROR_CODES = {
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottledException',
+    'TooManyRequestsException', 'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded', 'BandwidthLimitExceeded', 'RequestThrottled',
+    'SlowDown', 'PriorRequestNotComplete', 'EC2ThrottledException',
+}
+# codes meaning throttling for some services only, e.g. LimitExceededException is a quota of resources for
+# Firehose or CloudWatch Logs, but too many requests for Kinesis and Cost Explorer
+SERVICE_THROTTLING_ERROR_CODES = {
+    'kinesis': {'LimitExceededException'},
+    'ce': {'LimitExceededException'},
+    'apigateway': {'LimitExceededException'},
+}
+
+
+class TokenBucket:
+    """
+    Token bucket of a single API, holding up to a second worth of calls
+
+    rate -- calls per second, changed by on_throttle and on_success between min_rate and max_rate
+    """
+
+    def __init__(self, max_rate=DEFAULT_MAX_RATE, min_rate=DEFAULT_MIN_RATE):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.rate = max_rate
+        self.tokens = max_rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes a token, waiting for it if the bucket is empty. Tokens are reserved in order,
+        so concurrent callers wait in turn instead of all waking up at once.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+            self.tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_throttle(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate * RATE_DECREASE_FACTOR)
+            self.tokens = min(self.tokens, 0.0)
+
+    def on_success(self):
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + RATE_INCREASE_STEP)
+
+
+class RateLimiter:
+    """
+    Token buckets against (region, service, operation), created on first call
+    """
+
+    def __init__(self, max_rate=DEFAULT_MAX_RATE, min_rate=DEFAULT_MIN_RATE, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.max_attempts = max_attempts
+        self.buckets = dict()
+        self.lock = threading.Lock()
+
+    def configure(self, max_rate=DEFAULT_MAX_RATE, min_rate=DEFAULT_MIN_RATE, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Changes the limits of the buckets created from now on, and the retries of the clients created from now on
+        """
+        with self.lock:
+            self.max_rate = max_rate
+            self.min_rate = min_rate
+            self.max_attempts = max_attempts
+
+    def bucket(self, key):
+        with self.lock:
+            if key not in self.buckets:
+                self.buckets[key] = TokenBucket(self.max_rate, self.min_rate)
+            return self.buckets[key]
+
+    def install(self, client):
+        """
+        Registers the limiter on the events of the given client, for every attempt of every call
+        """
+        region = client.meta.region_name
+        service = client.meta.service_model.service_name
+
+        def before_send(event_name, **kwargs):
+            self.bucket((region, service, event_name.split(".")[-1])).acquire()
+
+        def needs_retry(response, operation, caught_exception, **kwargs):
+            bucket = self.bucket((region, service, operation.name))
+            if response is not None and is_throttling_code(response[1].get('Error', dict()).get('Code'), service):
+                bucket.on_throttle()
+            elif response is not None and caught_exception is None and response[0].status_code < 300:
+                bucket.on_success()
+
+        client.meta.events.register("before-send.*.*", before_send)
+        client.meta.events.register("needs-retry.*.*", needs_retry)
+        return client
+
+
+# limiter shared by all the clients of the process
+rate_limiter = RateLimiter()
+
+
+def configure_rate_limits(rate_limits_config):
+    """
+    Applies the "rate_limits" setting of config.json to the shared rate limiter
+    """
+    rate_limiter.configure(rate_limits_config.get("max_rate", DEFAULT_MAX_RATE),
+                           rate_limits_config.get("min_rate", DEFAULT_MIN_RATE),
+                           rate_limits_config.get("max_attempts", DEFAULT_MAX_ATTEMPTS))
+
+
+def create_client(service_name, region_name=None, session=None, max_pool_connections=None):
+    """
+    Returns a new client of the given service going through the shared rate limiter, with standard retries,
+    and reporting its calls to the shared metrics recorder. Use client_helpers.get_client for a shared one.
+
+    session -- boto3.Session to create the client with, None for the default session
+    max_pool_connections -- HTTP connections kept alive by the client, None for botocore's default
+    """
+    # boto3 takes most of the start-up time, it is loaded with the first client instead of at import
+    import boto3
+    from botocore.config import Config
+    config = Config(retries={'mode': 'standard', 'max_attempts': rate_limiter.max_attempts})
+    if max_pool_connections:
+        config = config.merge(Config(max_pool_connections=max_pool_connections))
+    client = (session or boto3).client(service_name, region_name=region_name, config=config)
+    recorder.install(client)
+    return rate_limiter.install(client)
+
+
+def is_throttling_code(code, service=None):
+    """
+    service -- service name of the client (e.g. "kinesis"), None for the codes meaning throttling for every service
+    """
+    return code in THROTTLING_ERROR_CODES or code in SERVICE_THROTTLING_ERROR_CODES.get(service, ())
+
+
+def is_throttling_error(error, service=None):
+    """
+    Returns whether the given exception is AWS throttling (of the given service, see is_throttling_code),
+    which must not be skipped over as a missing resource
+    """
+    return isinstance(error, ClientError) and is_throttling_code(error.response.get('Error', dict()).get('Code'), service)